@@ -1,9 +1,17 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, g
 from flask_cors import CORS
 import os
+import time
 import asyncio
 from functools import wraps
-from supabase_client import SupabaseManager
+from typing import Any, Dict, List, Tuple
+from supabase_client import SupabaseManager, DEVICE_FILTERS, ALERT_FILTERS, EXPORT_FILTERS
+from async_loop import run_async, iterate_async
+from exporter import EXPORT_FORMATS, encode_pages, gzip_chunks
+from sync_scheduler import SyncScheduler
+from live_updates import live_updates
+from fleet_snapshot import fleet_snapshot
+from metrics import registry, http_requests, http_request_duration, http_response_bytes
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,37 +36,116 @@ CORS(app)
 
 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Latência, status e bytes por rota (pelo padrão da rota, não pela URL, para limitar as séries)."""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        http_request_duration.observe(time.perf_counter() - started, route=route, method=request.method)
+        http_requests.inc(route=route, method=request.method, status=response.status_code)
+        if response.content_length:
+            http_response_bytes.inc(response.content_length, route=route)
+    return response
+
 # Inicializa o gerenciador do Supabase
 supabase = SupabaseManager()
 
+# Sincronização com o Datto em segundo plano (single-flight, opcionalmente periódica)
+scheduler = SyncScheduler()
+scheduler.start()
+
+# Prazo (s) para as consultas de uma rota; o que não chegar a tempo é omitido da página
+ROUTE_DEADLINE = float(os.getenv("ROUTE_DEADLINE", "5"))
+
 def async_route(f):
+    """Executa a view assíncrona no loop de eventos compartilhado do processo."""
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        return run_async(f(*args, **kwargs))
     return wrapper
 
+async def gather_with_deadline(timeout: float, **coros) -> Tuple[Dict[str, Any], List[str]]:
+    """Executa as consultas em paralelo; as que não terminarem no prazo (ou falharem) ficam de fora."""
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in coros.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    
+    results, missing = {}, []
+    for name, task in tasks.items():
+        if task in done and task.exception() is None:
+            results[name] = task.result()
+        else:
+            if task in done:
+                print(f"❌ Erro ao obter {name}: {task.exception()}")
+            missing.append(name)
+    if pending:
+        print(f"⚠️  Prazo de {timeout}s excedido para: {', '.join(missing)}")
+    return results, missing
+
 @app.route('/')
 @async_route
 async def dashboard():
     try:
-        # Obtém estatísticas do dashboard
-        stats = await supabase.get_dashboard_stats()
-        
-        # Obtém dados recentes
-        recent_devices = await supabase.get_recent_devices(5)
-        recent_alerts = await supabase.get_recent_alerts(5)
+        # Estatísticas e dados recentes em paralelo, limitados pelo prazo da rota
+        data = await get_dashboard_data()
         
         return render_template(
             'dashboard.html',
-            stats=stats,
-            recent_devices=recent_devices,
-            recent_alerts=recent_alerts,
+            stats=data.get('stats', {}),
+            recent_devices=data.get('recent_devices', []),
+            recent_alerts=data.get('recent_alerts', []),
+            partial_data=data['partial_data'],
             user={'email': 'admin@ness.com.br'}  # Usuário mock para compatibilidade
         )
     except Exception as e:
         print(f"❌ Erro no dashboard: {e}")
         return render_template('dashboard.html', error=str(e))
 
+async def get_dashboard_data() -> Dict[str, Any]:
+    """Estatísticas e dados recentes do dashboard (página e atualizações em tempo real)."""
+    results, missing = await gather_with_deadline(
+        ROUTE_DEADLINE,
+        stats=supabase.get_dashboard_stats(),
+        recent_devices=supabase.get_recent_devices(5),
+        recent_alerts=supabase.get_recent_alerts(5)
+    )
+    return {**results, 'partial_data': missing}
+
+async def publish_sync_update(job: Dict[str, Any]) -> None:
+    """Ao fim de uma sincronização, envia o dashboard atualizado a todas as conexões abertas."""
+    if job['status'] != 'succeeded' or not live_updates.subscribers:
+        return
+    # Uma única consulta para todos os operadores conectados
+    data = await get_dashboard_data()
+    live_updates.publish('dashboard', {**data, 'job_id': job['id']})
+
+scheduler.add_listener(publish_sync_update)
+
+@app.route('/events')
+def events():
+    """Atualizações do dashboard em tempo real (Server-Sent Events)"""
+    subscription = live_updates.subscribe()
+    if subscription is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Limite de conexões em tempo real atingido'
+        }), 503
+    
+    body = live_updates.stream(subscription, request.headers.get('Last-Event-ID'))
+    response = Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Libera a assinatura mesmo que o cliente desconecte antes do primeiro envio
+    response.call_on_close(lambda: live_updates.unsubscribe(subscription))
+    return response
+
 @app.route('/login')
 def login_404():
     """Retorna 404 para /login - sistema sem autenticação"""
@@ -69,59 +156,66 @@ def login_404():
 @app.route('/devices')
 @async_route
 async def devices():
-    page = request.args.get('page', 1, type=int)
-    site_uid = request.args.get('site_uid', '')
-    status = request.args.get('status', '')
+    page_size = request.args.get('page_size', type=int)
+    after = request.args.get('after') or None
+    before = request.args.get('before') or None
+    sort = request.args.get('sort', 'hostname')
     
-    filters = {}
-    if site_uid:
-        filters['site_uid'] = site_uid
-    if status:
-        filters['status'] = status
+    # Apenas filtros conhecidos e preenchidos; todos são aplicados no banco
+    filters = {name: request.args[name] for name in DEVICE_FILTERS if request.args.get(name)}
     
-    devices = await supabase.get_devices(filters)
+    page = await supabase.get_devices_page(filters, page_size=page_size, after=after, before=before, sort=sort)
     
     return render_template(
         'devices.html',
-        devices=devices,
-        current_page=page,
-        site_uid=site_uid,
-        status=status
+        devices=page['items'],
+        page=page,
+        filters=filters,
+        sort=page.get('sort', sort),
+        site_uid=filters.get('site_uid', ''),
+        status=filters.get('status', '')
     )
 
 @app.route('/device/<device_uid>')
 @async_route
 async def device_detail(device_uid):
-    device = await supabase.get_device_details(device_uid)
-    components = await supabase.get_device_components(device_uid) if device else []
+    # Dispositivo e componentes em paralelo; componentes são descartados se o dispositivo não existir
+    results, missing = await gather_with_deadline(
+        ROUTE_DEADLINE,
+        device=supabase.get_device_details(device_uid),
+        components=supabase.get_device_components(device_uid)
+    )
+    device = results.get('device')
+    components = results.get('components', []) if device else []
     
     return render_template(
         'device_detail.html',
         device=device,
-        components=components
+        components=components,
+        partial_data=missing
     )
 
 @app.route('/alerts')
 @async_route
 async def alerts():
-    page = request.args.get('page', 1, type=int)
-    severity = request.args.get('severity', '')
-    status = request.args.get('status', '')
+    page_size = request.args.get('page_size', type=int)
+    after = request.args.get('after') or None
+    before = request.args.get('before') or None
+    sort = request.args.get('sort', 'newest')
     
-    filters = {}
-    if severity:
-        filters['severity'] = severity
-    if status:
-        filters['status'] = status
+    # Apenas filtros conhecidos e preenchidos; todos são aplicados no banco
+    filters = {name: request.args[name] for name in ALERT_FILTERS if request.args.get(name)}
     
-    alerts = await supabase.get_alerts(filters)
+    page = await supabase.get_alerts_page(filters, page_size=page_size, after=after, before=before, sort=sort)
     
     return render_template(
         'alerts.html',
-        alerts=alerts,
-        current_page=page,
-        severity=severity,
-        status=status
+        alerts=page['items'],
+        page=page,
+        filters=filters,
+        sort=page.get('sort', sort),
+        severity=filters.get('severity', ''),
+        status=filters.get('status', '')
     )
 
 @app.route('/resolve_alert/<alert_uid>')
@@ -129,6 +223,13 @@ async def alerts():
 async def resolve_alert_route(alert_uid):
     success = await supabase.resolve_alert(alert_uid)
     if success:
+        if live_updates.subscribers:
+            # Só o alerta alterado e as novas estatísticas; a página aplica a diferença
+            results, _ = await gather_with_deadline(ROUTE_DEADLINE, stats=supabase.get_dashboard_stats())
+            live_updates.publish('alert', {
+                'alert': {'uid': alert_uid, 'status': 'resolved'},
+                **results
+            })
         return redirect(url_for('alerts'))
     else:
         return "Erro ao resolver alerta", 400
@@ -141,43 +242,46 @@ async def sites():
 
 @app.route('/sync')
 @async_route
-async def sync_data():
-    try:
-        from data_collector import DataCollector
-        collector = DataCollector()
-        success = await collector.collect_all_data()
-        
-        if success:
-            return jsonify({
-                'status': 'success',
-                'message': 'Dados sincronizados com sucesso!',
-                'timestamp': '2025-01-27T10:00:00Z'
-            })
-        else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Erro ao sincronizar dados',
-                'timestamp': '2025-01-27T10:00:00Z'
-            }), 500
-    except Exception as e:
-        print(f"❌ Erro na sincronização: {e}")
-        return jsonify({
-            'status': 'error',
-            'message': f'Erro interno: {str(e)}',
-            'timestamp': '2025-01-27T10:00:00Z'
-        }), 500
+async def sync():
+    """Inicia a sincronização em segundo plano e retorna imediatamente"""
+    full = request.args.get('full', '').lower() in ('1', 'true')
+    job, created = await scheduler.trigger(source='manual', full=full)
+    return jsonify({
+        'status': 'accepted' if created else 'running',
+        'message': 'Sincronização iniciada' if created else 'Já existe uma sincronização em andamento',
+        'job': job,
+        'status_url': url_for('sync_status', job_id=job['id']),
+        'timestamp': job['created_at']
+    }), 202
+
+@app.route('/sync/status')
+@app.route('/sync/status/<job_id>')
+def sync_status(job_id=None):
+    """Status e progresso de um job de sincronização (ou do mais recente)"""
+    job = scheduler.get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job de sincronização não encontrado'}), 404
+    return jsonify({'job': job, 'recent_jobs': scheduler.list_jobs() if job_id is None else None})
+
+@app.route('/sync/cancel/<job_id>', methods=['POST'])
+@async_route
+async def sync_cancel(job_id):
+    """Cancela o job de sincronização em andamento"""
+    if await scheduler.cancel(job_id):
+        return jsonify({'status': 'cancelling', 'job_id': job_id}), 202
+    return jsonify({'status': 'error', 'message': 'Job não está em andamento'}), 409
 
 @app.route('/test-collector')
 @async_route
 async def test_collector():
     try:
         from data_collector import DataCollector
-        collector = DataCollector()
         
         # Testa coleta de dados
-        sites = await collector.collect_sites()
-        devices = await collector.collect_devices()
-        alerts = await collector.collect_alerts()
+        async with DataCollector() as collector:
+            sites = await collector.collect_sites()
+            devices = await collector.collect_devices()
+            alerts = await collector.collect_alerts()
         
         return jsonify({
             'status': 'success',
@@ -210,6 +314,53 @@ async def get_user():
         'authenticated': True
     })
 
+@app.route('/export/<table_name>.<fmt>')
+def export_table(table_name, fmt):
+    """Exporta uma tabela completa em NDJSON/CSV/JSON, em streaming e com gzip opcional"""
+    if table_name not in EXPORT_FILTERS or fmt not in EXPORT_FORMATS:
+        return jsonify({
+            'status': 'error',
+            'message': f'Exportação disponível para {", ".join(EXPORT_FILTERS)} em {", ".join(EXPORT_FORMATS)}'
+        }), 404
+    
+    filters = {name: request.args[name] for name in EXPORT_FILTERS[table_name] if request.args.get(name)}
+    batch_size = request.args.get('batch_size', type=int)
+    
+    # Cada lote lido do Supabase é convertido e enviado antes do próximo ser buscado
+    pages = iterate_async(supabase.iter_table(table_name, filters, batch_size=batch_size))
+    body = encode_pages(pages, fmt)
+    
+    headers = {
+        'Content-Disposition': f'attachment; filename="{table_name}.{fmt}"',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no'
+    }
+    if 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        body = gzip_chunks(body)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(body, mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+@app.route('/api/cache-stats')
+def cache_stats():
+    """Contadores do cache de leitura do Supabase"""
+    return jsonify(supabase.get_cache_stats())
+
+@app.route('/api/fleet-stats')
+def fleet_stats():
+    """Tamanho e atualização da frota em memória usada pelo coletor e pelas rotas"""
+    return jsonify(fleet_snapshot.stats())
+
+@app.route('/api/live-stats')
+def live_stats():
+    """Conexões abertas e eventos enviados pelas atualizações em tempo real"""
+    return jsonify(live_updates.stats())
+
+@app.route('/metrics')
+def metrics():
+    """Métricas do processo no formato texto do Prometheus."""
+    return Response(registry.render(), content_type=registry.CONTENT_TYPE)
+
 @app.route('/postman-test')
 @async_route
 async def postman_test():
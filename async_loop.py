@@ -0,0 +1,74 @@
+import asyncio
+import atexit
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+# Loop de eventos único do processo, executado em uma thread dedicada.
+# Recursos ligados ao loop (sessões HTTP, pools, tarefas em segundo plano)
+# podem ser reaproveitados entre requisições.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Retorna o loop compartilhado, iniciando a thread na primeira chamada."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="async-loop", daemon=True)
+            thread.start()
+        return _loop
+
+def submit(coro: Coroutine) -> Future:
+    """Agenda a corrotina no loop compartilhado preservando o contexto do chamador.
+    
+    O contexto (contextvars) é copiado para que a corrotina enxergue o contexto de
+    requisição/aplicação do Flask da thread que a submeteu.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    future: Future = Future()
+    
+    def start():
+        task = loop.create_task(coro, context=context)
+        
+        def done(t: asyncio.Task):
+            if t.cancelled():
+                future.cancel()
+            elif t.exception() is not None:
+                future.set_exception(t.exception())
+            else:
+                future.set_result(t.result())
+        
+        task.add_done_callback(done)
+    
+    loop.call_soon_threadsafe(start)
+    return future
+
+def run_async(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """Executa a corrotina no loop compartilhado e aguarda o resultado."""
+    return submit(coro).result(timeout)
+
+def iterate_async(agen: AsyncIterator) -> Iterator:
+    """Consome um gerador assíncrono a partir de código síncrono (ex.: respostas em streaming do Flask)."""
+    async def next_item():
+        return await agen.__anext__()
+    
+    async def close():
+        await agen.aclose()
+    
+    try:
+        while True:
+            try:
+                yield run_async(next_item())
+            except StopAsyncIteration:
+                break
+    finally:
+        run_async(close())
+
+@atexit.register
+def _shutdown() -> None:
+    if _loop is not None and _loop.is_running():
+        _loop.call_soon_threadsafe(_loop.stop)
@@ -0,0 +1 @@
+"""Benchmarks e testes de carga do coletor Datto e das rotas Flask (veja docs/BENCHMARKS.md)."""
@@ -0,0 +1,181 @@
+"""Benchmark de DataCollector.collect_all_data contra o Datto fake e o Supabase fake.
+
+Para cada tamanho de frota sobe um servidor Datto fake (subprocesso) e um
+Supabase em memória, e executa `--runs` sincronizações: a primeira completa
+(banco vazio) e as seguintes após uma "geração" de alterações na frota.
+
+    python -m benchmarks.bench_collector --devices 1000,10000 --datto-latency-ms 20 --output collector.json
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import subprocess
+from typing import Dict, List, Any
+
+import aiohttp
+
+from benchmarks.common import REPO_ROOT, log, peak_rss_mb, free_port, environment, parse_env, write_results
+from benchmarks.fake_supabase import FakeSupabaseClient, install
+
+PHASES = ['sites', 'devices', 'alerts', 'rollups', 'components', 'done']
+
+
+def start_fake_datto(args: argparse.Namespace, devices: int, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, '-m', 'benchmarks.fake_datto',
+        '--port', str(port),
+        '--devices', str(devices),
+        '--components', str(args.components),
+        '--alerts-per-device', str(args.alerts_per_device),
+        '--change-rate', str(args.change_rate),
+        '--latency-ms', str(args.datto_latency_ms),
+        '--jitter-ms', str(args.datto_jitter_ms),
+        '--error-rate', str(args.datto_error_rate),
+    ]
+    process = subprocess.Popen(command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            with __import__('socket').create_connection(('127.0.0.1', port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Servidor Datto fake não respondeu")
+
+
+async def advance_generation(base: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{base}/_bench/advance") as response:
+            response.raise_for_status()
+
+
+def phase_durations(marks: Dict[str, float], finished: float) -> Dict[str, float]:
+    seen = [p for p in PHASES if p in marks]
+    durations = {}
+    for i, phase in enumerate(seen):
+        if phase == 'done':
+            continue
+        end = marks[seen[i + 1]] if i + 1 < len(seen) else finished
+        durations[phase] = round(end - marks[phase], 4)
+    return durations
+
+
+async def run_once(client: FakeSupabaseClient, devices: int, run: int, args: argparse.Namespace) -> Dict[str, Any]:
+    from data_collector import DataCollector
+    
+    client.reset_counters()
+    marks: Dict[str, float] = {}
+    if args.tracemalloc:
+        tracemalloc.reset_peak()
+    
+    collector = DataCollector()
+    collector.progress_callback = lambda phase, details: marks.setdefault(phase, time.perf_counter())
+    if args.skip_components:
+        async def no_components(device_list):
+            return []
+        collector.collect_all_components = no_components
+    
+    started = time.perf_counter()
+    async with collector:
+        ok = await collector.collect_all_data()
+    finished = time.perf_counter()
+    elapsed = finished - started
+    
+    result = {
+        'devices': devices,
+        'run': run,
+        'kind': 'cold' if run == 1 else 'warm',
+        'ok': ok,
+        'seconds': round(elapsed, 4),
+        'devices_per_second': round(devices / elapsed, 1) if elapsed else None,
+        'phases': phase_durations(marks, finished),
+        'datto_requests': dict(collector.request_stats),
+        'supabase': client.stats(),
+        'writer': dict(collector.writer.stats),
+        'sync_stats': collector.last_sync_stats,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if args.tracemalloc:
+        result['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    return result
+
+
+async def bench_fleet(devices: int, args: argparse.Namespace, workdir: str) -> List[Dict[str, Any]]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        'DATTO_API_URL': f"{base}/api/v2",
+        'DATTO_LAST_GOOD_DIR': os.path.join(workdir, str(devices), 'last_good'),
+        'DATTO_RESPONSE_CACHE_DIR': os.path.join(workdir, str(devices), 'http_cache'),
+    })
+    
+    client = FakeSupabaseClient(args.supabase_latency_ms, args.supabase_jitter_ms)
+    install(client)
+    process = start_fake_datto(args, devices, port)
+    results = []
+    try:
+        for run in range(1, args.runs + 1):
+            if run > 1:
+                await advance_generation(base)
+            log(f"⏱️  {devices} dispositivos, execução {run}/{args.runs}...")
+            result = await run_once(client, devices, run, args)
+            log(f"   {result['seconds']:.2f}s ({result['devices_per_second']} dispositivos/s), "
+                f"pico de memória {result['peak_rss_mb']} MB")
+            results.append(result)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', default='1000', help='tamanhos de frota separados por vírgula (ex.: 1000,10000,100000)')
+    parser.add_argument('--runs', type=int, default=2, help='sincronizações por tamanho (a 1ª é completa)')
+    parser.add_argument('--components', type=int, default=4, help='componentes por dispositivo')
+    parser.add_argument('--alerts-per-device', type=float, default=0.2)
+    parser.add_argument('--change-rate', type=float, default=0.05, help='fração da frota alterada entre execuções')
+    parser.add_argument('--skip-components', action='store_true', help='não coleta componentes')
+    parser.add_argument('--datto-latency-ms', type=float, default=0)
+    parser.add_argument('--datto-jitter-ms', type=float, default=0)
+    parser.add_argument('--datto-error-rate', type=float, default=0)
+    parser.add_argument('--supabase-latency-ms', type=float, default=0)
+    parser.add_argument('--supabase-jitter-ms', type=float, default=0)
+    parser.add_argument('--tracemalloc', action='store_true', help='mede o pico de memória Python (mais lento)')
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help='variável de ambiente da aplicação (repetível)')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args()
+    
+    # Antes de importar a aplicação: vários módulos leem o ambiente na importação
+    os.environ.update({
+        'DATTO_API_KEY': 'bench',
+        'DATTO_API_SECRET': 'bench',
+        'DATTO_RATE_LIMIT': '1000000000',
+        'DATTO_RATE_BURST': '1000000',
+        'SYNC_INTERVAL_SECONDS': '0',
+    })
+    os.environ.update(parse_env(args.env))
+    if args.tracemalloc:
+        tracemalloc.start()
+    
+    sizes = [int(size) for size in args.devices.split(',') if size.strip()]
+    # Os prints da aplicação vão para stderr para não misturar com o JSON
+    with tempfile.TemporaryDirectory(prefix='ndatto-bench-') as workdir, contextlib.redirect_stdout(sys.stderr):
+        results = []
+        for devices in sizes:
+            results.extend(asyncio.run(bench_fleet(devices, args, workdir)))
+    
+    params = {k: v for k, v in vars(args).items() if k != 'output'}
+    write_results({'benchmark': 'collector', 'environment': environment(), 'params': params, 'results': results},
+                  args.output)
+
+
+if __name__ == '__main__':
+    main()
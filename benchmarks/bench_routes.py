@@ -0,0 +1,160 @@
+"""Teste de carga das rotas Flask com o Supabase fake populado.
+
+Popula o Supabase em memória com uma frota gerada pelo Datto fake, sobe a
+aplicação no servidor WSGI do werkzeug (multithread, como `app.run`) e dispara
+requisições concorrentes em cada rota, medindo vazão e latência.
+
+    python -m benchmarks.bench_routes --devices 10000 --concurrency 16 --requests 500 --supabase-latency-ms 5
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import contextlib
+from collections import Counter
+from typing import Dict, List, Any
+
+import aiohttp
+
+from benchmarks.common import log, percentiles, peak_rss_mb, free_port, environment, parse_env, write_results
+from benchmarks.fake_datto import FakeDatto
+from benchmarks.fake_supabase import FakeSupabaseClient, install
+
+DEFAULT_ROUTES = [
+    '/',
+    '/devices',
+    '/devices?status=online&sort=last_seen',
+    '/device/dev-0000001',
+    '/alerts',
+    '/alerts?severity=high',
+    '/sites',
+    '/api/cache-stats',
+]
+
+
+def seed(client: FakeSupabaseClient, args: argparse.Namespace) -> None:
+    fleet = FakeDatto(args.devices, 0, args.alerts_per_device, args.components, 0, 0, 0, 0)
+    client.seed('sites', (fleet.site(i) for i in range(fleet.sites)))
+    client.seed('devices', (fleet.device(i) for i in range(fleet.devices)))
+    client.seed('alerts', (fleet.alert(i) for i in range(fleet.alerts)))
+    client.seed('device_components', (
+        dict(component, device_uid=f'dev-{i:07d}')
+        for i in range(fleet.devices) for component in fleet.component_list(i)
+    ))
+    client.rpc('refresh_site_rollups', {'site_uids': None}).execute()
+    client.reset_counters()
+
+
+def start_server(port: int):
+    from werkzeug.serving import make_server
+    from app import app
+    
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+async def load_route(session: aiohttp.ClientSession, url: str, total: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    remaining = total
+    
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 4),
+        'rps': round(total / elapsed, 1) if elapsed else None,
+        'errors': errors,
+        'statuses': {str(code): n for code, n in sorted(statuses.items())},
+        'latency_ms': percentiles(latencies),
+    }
+
+
+async def run_load(base: str, routes: List[str], args: argparse.Namespace, client: FakeSupabaseClient) -> List[Dict[str, Any]]:
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    results = []
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        for route in routes:
+            url = base + route
+            if args.warmup:
+                await load_route(session, url, args.warmup, min(args.concurrency, args.warmup))
+            client.reset_counters()
+            log(f"⏱️  {route}: {args.requests} requisições, concorrência {args.concurrency}...")
+            result = await load_route(session, url, args.requests, args.concurrency)
+            result['route'] = route
+            result['supabase_calls'] = sum(client.calls.values())
+            log(f"   {result['rps']} req/s, p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms")
+            results.append(result)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--devices', type=int, default=1000, help='tamanho da frota no Supabase fake')
+    parser.add_argument('--components', type=int, default=4, help='componentes por dispositivo')
+    parser.add_argument('--alerts-per-device', type=float, default=0.2)
+    parser.add_argument('--route', action='append', dest='routes', metavar='CAMINHO',
+                        help='rota a testar (repetível; padrão: páginas principais)')
+    parser.add_argument('--requests', type=int, default=200, help='requisições por rota')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=10, help='requisições de aquecimento por rota')
+    parser.add_argument('--timeout', type=float, default=60, help='timeout por requisição (s)')
+    parser.add_argument('--supabase-latency-ms', type=float, default=0)
+    parser.add_argument('--supabase-jitter-ms', type=float, default=0)
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help='variável de ambiente da aplicação (repetível, ex.: SUPABASE_CACHE_TTL=0)')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args()
+    
+    # Antes de importar a aplicação: vários módulos leem o ambiente na importação
+    os.environ['SYNC_INTERVAL_SECONDS'] = '0'
+    os.environ.update(parse_env(args.env))
+    
+    client = FakeSupabaseClient(args.supabase_latency_ms, args.supabase_jitter_ms)
+    log(f"🌱 Populando Supabase fake com {args.devices} dispositivos...")
+    seed(client, args)
+    install(client)
+    
+    port = free_port()
+    # Os prints da aplicação vão para stderr para não misturar com o JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        server = start_server(port)
+        try:
+            results = asyncio.run(run_load(f"http://127.0.0.1:{port}", args.routes or DEFAULT_ROUTES, args, client))
+        finally:
+            server.shutdown()
+    
+    params = {k: v for k, v in vars(args).items() if k != 'output'}
+    params['routes'] = args.routes or DEFAULT_ROUTES
+    write_results({
+        'benchmark': 'routes',
+        'environment': environment(),
+        'params': params,
+        'results': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
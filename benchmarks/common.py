@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import socket
+import platform
+import resource
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+# Raiz do repositório: os benchmarks importam os módulos da aplicação diretamente
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def log(message: str) -> None:
+    """Mensagens de progresso vão para stderr; stdout fica só com o JSON dos resultados."""
+    print(message, file=sys.stderr, flush=True)
+
+
+def percentiles(samples: List[float], points=(50, 90, 95, 99)) -> Dict[str, Optional[float]]:
+    """Percentis (interpolação linear) em milissegundos, além de mínimo, máximo e média."""
+    if not samples:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        position = (len(ordered) - 1) * p / 100
+        lower = int(position)
+        upper = min(lower + 1, len(ordered) - 1)
+        value = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        result[f'p{p}'] = round(value * 1000, 3)
+    result['min'] = round(ordered[0] * 1000, 3)
+    result['max'] = round(ordered[-1] * 1000, 3)
+    result['mean'] = round(sum(ordered) / len(ordered) * 1000, 3)
+    return result
+
+
+def peak_rss_mb() -> float:
+    """Pico de memória residente do processo (MB)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def environment() -> Dict[str, Any]:
+    """Metadados da execução para comparar resultados entre versões."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def parse_env(pairs: List[str]) -> Dict[str, str]:
+    """Converte `--env CHAVE=VALOR` (repetível) em dicionário."""
+    env = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition('=')
+        env[key] = value
+    return env
+
+
+def write_results(report: Dict[str, Any], output: Optional[str]) -> None:
+    """Grava o relatório em JSON no arquivo informado (ou em stdout)."""
+    payload = json.dumps(report, indent=2, default=str)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(payload + '\n')
+        log(f"📄 Resultados gravados em {output}")
+    else:
+        print(payload)
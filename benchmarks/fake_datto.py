@@ -0,0 +1,193 @@
+"""Servidor fake da API Datto RMM para benchmarks.
+
+Gera sites, dispositivos, alertas e componentes de forma determinística a partir
+do índice de cada registro (sem guardar a frota em memória), com paginação por
+`pageDetails.nextPageUrl`, filtro `changedSince`, ETag nos componentes e
+latência/erros injetados.
+
+    python -m benchmarks.fake_datto --port 8765 --devices 10000 --latency-ms 20
+
+`POST /_bench/advance` avança uma "geração": parte da frota (`--change-rate`)
+muda de conteúdo, como entre duas sincronizações reais.
+"""
+import asyncio
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeDatto:
+    def __init__(self, devices: int, sites: int, alerts_per_device: float, components: int,
+                 change_rate: float, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.devices = devices
+        self.sites = sites or max(1, devices // 50)
+        self.alerts = int(devices * alerts_per_device)
+        self.components = components
+        self.step = max(1, round(1 / change_rate)) if change_rate > 0 else 0
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.generation = 0
+        self.requests = 0
+    
+    def version(self, index: int) -> int:
+        """Quantas vezes o registro mudou até a geração atual."""
+        if not self.step:
+            return 0
+        return (index + self.generation) // self.step - index // self.step
+    
+    def changed_now(self, index: int) -> bool:
+        return bool(self.step) and self.generation > 0 and (index + self.generation) % self.step == 0
+    
+    def site(self, i: int) -> dict:
+        return {
+            'uid': f'site-{i:06d}',
+            'name': f'Site {i}',
+            'address': f'Rua {i}, {i % 1000}',
+            'status': 'active',
+            'device_count': self.devices // self.sites
+        }
+    
+    def device(self, i: int) -> dict:
+        version = self.version(i)
+        return {
+            'uid': f'dev-{i:07d}',
+            'hostname': f'host-{i:07d}',
+            'site_uid': f'site-{i % self.sites:06d}',
+            'status': 'online' if (i + version) % 4 else 'offline',
+            'ip_address': f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}',
+            'last_seen': (EPOCH + timedelta(minutes=i % 100000, seconds=version)).isoformat(),
+            'os': ('Windows 11', 'Windows Server 2022', 'Ubuntu 22.04')[i % 3],
+            'memory': f'{8 << (i % 3)}GB',
+            'cpu': 'Intel Xeon'
+        }
+    
+    def alert(self, i: int) -> dict:
+        version = self.version(i)
+        return {
+            'uid': f'alert-{i:07d}',
+            'device_uid': f'dev-{i % max(1, self.devices):07d}',
+            'alert_type': ('device_offline', 'high_cpu_usage', 'low_disk_space')[i % 3],
+            'severity': ('low', 'medium', 'high', 'critical')[i % 4],
+            'status': 'resolved' if (i + version) % 3 == 0 else 'new',
+            'message': f'Alerta {i}',
+            'created_at': (EPOCH + timedelta(minutes=i)).isoformat()
+        }
+    
+    def component_list(self, device_index: int) -> list:
+        version = self.version(device_index)
+        return [
+            {
+                'uid': f'comp-{device_index:07d}-{c}',
+                'name': ('CPU', 'Memory', 'Disk C:', 'Network Interface')[c % 4],
+                'type': ('processor', 'memory', 'storage', 'network')[c % 4],
+                'status': 'warning' if c == 2 and version % 2 else 'healthy',
+                'details': f'v{version}'
+            }
+            for c in range(self.components)
+        ]
+
+
+async def _delay(fake: FakeDatto) -> None:
+    fake.requests += 1
+    if fake.latency or fake.jitter:
+        await asyncio.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+
+
+def _maybe_error(fake: FakeDatto):
+    if fake.error_rate and random.random() < fake.error_rate:
+        return web.Response(status=503, text='injected error')
+    return None
+
+
+def _list_handler(kind: str):
+    async def handler(request: web.Request) -> web.Response:
+        fake: FakeDatto = request.app['fake']
+        await _delay(fake)
+        error = _maybe_error(fake)
+        if error is not None:
+            return error
+        
+        total = {'sites': fake.sites, 'devices': fake.devices, 'alerts': fake.alerts}[kind]
+        build = {'sites': fake.site, 'devices': fake.device, 'alerts': fake.alert}[kind]
+        size = int(request.query.get('max', '250'))
+        page = int(request.query.get('page', '0'))
+        
+        if request.query.get('changedSince') and kind != 'sites':
+            # Delta: só os registros alterados na geração atual, em uma página
+            items = [build(i) for i in range(total) if fake.changed_now(i)]
+            return web.json_response({'pageDetails': {'count': len(items), 'nextPageUrl': None}, 'data': items})
+        
+        start = page * size
+        items = [build(i) for i in range(start, min(total, start + size))]
+        next_url = None
+        if start + size < total:
+            next_url = f"http://{request.host}{request.path}?max={size}&page={page + 1}"
+        return web.json_response({'pageDetails': {'count': len(items), 'nextPageUrl': next_url}, 'data': items})
+    return handler
+
+
+async def components_handler(request: web.Request) -> web.Response:
+    fake: FakeDatto = request.app['fake']
+    await _delay(fake)
+    error = _maybe_error(fake)
+    if error is not None:
+        return error
+    
+    uid = request.match_info['device_uid']
+    try:
+        index = int(uid.rsplit('-', 1)[-1])
+    except ValueError:
+        return web.Response(status=404)
+    etag = f'"{uid}-{fake.version(index)}"'
+    if request.headers.get('If-None-Match') == etag:
+        return web.Response(status=304, headers={'ETag': etag})
+    return web.json_response({'data': fake.component_list(index)}, headers={'ETag': etag})
+
+
+async def advance_handler(request: web.Request) -> web.Response:
+    fake: FakeDatto = request.app['fake']
+    fake.generation += 1
+    return web.json_response({'generation': fake.generation})
+
+
+async def stats_handler(request: web.Request) -> web.Response:
+    fake: FakeDatto = request.app['fake']
+    return web.json_response({'generation': fake.generation, 'requests': fake.requests})
+
+
+def build_app(fake: FakeDatto) -> web.Application:
+    app = web.Application()
+    app['fake'] = fake
+    for kind in ('sites', 'devices', 'alerts'):
+        app.router.add_get(f'/api/v2/{kind}', _list_handler(kind))
+    app.router.add_get('/api/v2/devices/{device_uid}/components', components_handler)
+    app.router.add_post('/_bench/advance', advance_handler)
+    app.router.add_get('/_bench/stats', stats_handler)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--sites', type=int, default=0, help='padrão: 1 site a cada 50 dispositivos')
+    parser.add_argument('--alerts-per-device', type=float, default=0.2)
+    parser.add_argument('--components', type=int, default=4, help='componentes por dispositivo')
+    parser.add_argument('--change-rate', type=float, default=0.05, help='fração da frota alterada por geração')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0, help='fração de respostas 503')
+    args = parser.parse_args()
+    
+    fake = FakeDatto(args.devices, args.sites, args.alerts_per_device, args.components,
+                     args.change_rate, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"🧪 Datto fake em http://127.0.0.1:{args.port}/api/v2 ({args.devices} dispositivos)", flush=True)
+    web.run_app(build_app(fake), host='127.0.0.1', port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+"""Cliente Supabase/PostgREST fake, em memória, para benchmarks.
+
+Implementa a parte do construtor de consultas do postgrest-py usada pela
+aplicação (select/filtros/order/range, insert/upsert/update/delete, filtros
+lógicos `or` da paginação por cursor e as RPCs das migrações), com latência
+injetada por chamada. `execute()` é síncrono como no cliente real, então a
+latência ocupa as threads do pool do SupabaseManager.
+"""
+import re
+import time
+import random
+import threading
+import functools
+from collections import Counter
+from typing import Dict, List, Any, Optional, Callable
+
+
+# Relações para os embeds do select: (tabela, tabela relacionada) -> (coluna local, coluna remota)
+EMBEDS = {
+    ('sites', 'site_rollups'): ('uid', 'site_uid'),
+}
+
+
+class FakeResponse:
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _split(body: str) -> List[str]:
+    """Divide `a,b,or(c,d)` nas vírgulas de primeiro nível, respeitando aspas."""
+    parts, depth, current, quoted, escaped = [], 0, '', False, False
+    for ch in body:
+        if quoted:
+            current += ch
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                quoted = False
+            continue
+        if ch == '"':
+            quoted = True
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _unquote(value: str) -> str:
+    if value.startswith('"') and value.endswith('"'):
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _compare(op: str, actual: Any, expected: Any) -> bool:
+    if op == 'is':
+        return actual is None if str(expected).lower() == 'null' else actual == expected
+    if actual is None:
+        return False
+    if op == 'eq':
+        return str(actual) == str(expected)
+    if op == 'neq':
+        return str(actual) != str(expected)
+    if op == 'in':
+        return str(actual) in expected
+    if op in ('like', 'ilike'):
+        pattern = '^' + re.escape(str(expected)).replace(r'\*', '.*').replace('%', '.*') + '$'
+        return re.match(pattern, str(actual), re.IGNORECASE if op == 'ilike' else 0) is not None
+    if isinstance(actual, (int, float)) and not isinstance(expected, (int, float)):
+        try:
+            expected = float(expected)
+        except ValueError:
+            actual = str(actual)
+    elif not isinstance(actual, (int, float)):
+        actual, expected = str(actual), str(expected)
+    return {'gt': actual > expected, 'gte': actual >= expected,
+            'lt': actual < expected, 'lte': actual <= expected}[op]
+
+
+def _parse_logic(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """Converte um filtro lógico do PostgREST (`or(...)`, `and(...)`, `col.op.valor`) em predicado."""
+    for op in ('or', 'and'):
+        if expr.startswith(op + '('):
+            subs = [_parse_logic(part) for part in _split(expr[len(op) + 1:-1])]
+            if op == 'or':
+                return lambda row: any(f(row) for f in subs)
+            return lambda row: all(f(row) for f in subs)
+    
+    column, rest = expr.split('.', 1)
+    negate = rest.startswith('not.')
+    if negate:
+        rest = rest[4:]
+    op, value = rest.split('.', 1)
+    expected = {_unquote(v) for v in _split(value[1:-1])} if op == 'in' else _unquote(value)
+    return lambda row: _compare(op, row.get(column), expected) != negate
+
+
+class _Params:
+    """Imita `httpx.QueryParams.add`, usado pela aplicação para o filtro `or` da paginação."""
+    
+    def __init__(self, query: 'FakeQuery'):
+        self.query = query
+    
+    def add(self, key: str, value: str) -> '_Params':
+        if key == 'or':
+            self.query._filters.append(_parse_logic('or' + value))
+        return self
+    
+    def set(self, key: str, value: str) -> '_Params':
+        if key == 'order':
+            # `coluna.asc|desc[.nullsfirst|.nullslast]` separados por vírgula; sem a posição dos
+            # nulos vale o padrão do Postgres (primeiro em DESC, no fim em ASC)
+            self.query._order = []
+            for item in value.split(','):
+                column, *modifiers = item.split('.')
+                desc = 'desc' in modifiers
+                nullsfirst = 'nullsfirst' in modifiers or (desc and 'nullslast' not in modifiers)
+                self.query._order.append((column, desc, nullsfirst))
+        return self
+
+
+class FakeQuery:
+    def __init__(self, client: 'FakeSupabaseClient', table: str):
+        self._client = client
+        self._table = table
+        self._op = 'select'
+        self._columns = '*'
+        self._count = None
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[tuple] = []
+        self._range = None
+        self._limit = None
+        self._payload = None
+        self._on_conflict = None
+        self.params = _Params(self)
+    
+    # --- leitura
+    def select(self, columns: str = '*', count: Optional[str] = None) -> 'FakeQuery':
+        self._op, self._columns, self._count = 'select', columns, count
+        return self
+    
+    def _filter(self, column: str, op: str, value: Any) -> 'FakeQuery':
+        self._filters.append(lambda row: _compare(op, row.get(column), value))
+        return self
+    
+    def eq(self, column, value): return self._filter(column, 'eq', value)
+    def neq(self, column, value): return self._filter(column, 'neq', value)
+    def gt(self, column, value): return self._filter(column, 'gt', value)
+    def gte(self, column, value): return self._filter(column, 'gte', value)
+    def lt(self, column, value): return self._filter(column, 'lt', value)
+    def lte(self, column, value): return self._filter(column, 'lte', value)
+    def like(self, column, value): return self._filter(column, 'like', value)
+    def ilike(self, column, value): return self._filter(column, 'ilike', value)
+    def is_(self, column, value): return self._filter(column, 'is', value)
+    def in_(self, column, values): return self._filter(column, 'in', {str(v) for v in values})
+    
+    def order(self, column: str, desc: bool = False, nullsfirst: bool = False, **kwargs) -> 'FakeQuery':
+        # Como o postgrest-py: cada chamada é um parâmetro `order` repetido, sem `nullslast` (em DESC
+        # o Postgres põe os nulos primeiro), e o PostgREST só considera um deles (aqui, o primeiro)
+        if not self._order:
+            self._order.append((column, desc, nullsfirst or desc))
+        return self
+    
+    def range(self, start: int, end: int) -> 'FakeQuery':
+        self._range = (start, end)
+        return self
+    
+    def limit(self, size: int, **kwargs) -> 'FakeQuery':
+        self._limit = size
+        return self
+    
+    # --- escrita
+    def insert(self, rows, **kwargs) -> 'FakeQuery':
+        self._op, self._payload = 'insert', rows if isinstance(rows, list) else [rows]
+        return self
+    
+    def upsert(self, rows, on_conflict: str = '', **kwargs) -> 'FakeQuery':
+        self._op, self._payload = 'upsert', rows if isinstance(rows, list) else [rows]
+        self._on_conflict = on_conflict or 'uid'
+        return self
+    
+    def update(self, values: Dict[str, Any], **kwargs) -> 'FakeQuery':
+        self._op, self._payload = 'update', values
+        return self
+    
+    def delete(self, **kwargs) -> 'FakeQuery':
+        self._op = 'delete'
+        return self
+    
+    # Caminho e método da requisição PostgREST equivalente (rótulos das métricas)
+    @property
+    def path(self) -> str:
+        return f'/{self._table}'
+    
+    @property
+    def http_method(self) -> str:
+        return {'select': 'GET', 'insert': 'POST', 'upsert': 'POST', 'update': 'PATCH', 'delete': 'DELETE'}[self._op]
+    
+    def execute(self) -> FakeResponse:
+        return self._client._execute(self)
+
+
+class FakeRpc:
+    def __init__(self, client: 'FakeSupabaseClient', name: str, params: Dict[str, Any]):
+        self._client, self._name, self._params = client, name, params or {}
+        self.path, self.http_method = f'/rpc/{name}', 'POST'
+    
+    def execute(self) -> FakeResponse:
+        return self._client._execute_rpc(self._name, self._params)
+
+
+class FakeSupabaseClient:
+    """Tabelas em memória com latência por chamada e contadores de operações."""
+    
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.calls: Counter = Counter()
+        self.rows_written: Counter = Counter()
+        self._versions: Counter = Counter()
+        self._sorted_cache: Dict[tuple, List[Dict[str, Any]]] = {}
+        self._indexes: Dict[tuple, Dict[Any, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+    
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+    
+    def from_(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+    
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> FakeRpc:
+        return FakeRpc(self, name, params)
+    
+    def seed(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self.tables.setdefault(table, []).extend(dict(r) for r in rows)
+            self._changed(table)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': dict(self.calls),
+            'rows_written': dict(self.rows_written),
+            'table_sizes': {name: len(rows) for name, rows in self.tables.items()}
+        }
+    
+    def reset_counters(self) -> None:
+        self.calls.clear()
+        self.rows_written.clear()
+    
+    def _sleep(self) -> None:
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+    
+    def _changed(self, table: str, keep_indexes: bool = False) -> None:
+        """Invalida ordenações em cache (e índices de upsert) após uma escrita."""
+        self._versions[table] += 1
+        if not keep_indexes:
+            self._indexes = {k: v for k, v in self._indexes.items() if k[0] != table}
+    
+    def _index(self, table: str, column: str) -> Dict[Any, Dict[str, Any]]:
+        key = (table, column)
+        if key not in self._indexes:
+            self._indexes[key] = {r.get(column): r for r in self.tables.get(table, [])}
+        return self._indexes[key]
+    
+    def _sorted(self, table: str, order: List[tuple]) -> List[Dict[str, Any]]:
+        """Linhas ordenadas, em cache até a próxima escrita na tabela."""
+        rows = self.tables.get(table, [])
+        if not order:
+            return rows
+        key = (table, tuple(order), self._versions[table])
+        if key not in self._sorted_cache:
+            def compare(a, b):
+                for column, desc, nullsfirst in order:
+                    x, y = a.get(column), b.get(column)
+                    if x == y:
+                        continue
+                    if x is None:
+                        return -1 if nullsfirst else 1
+                    if y is None:
+                        return 1 if nullsfirst else -1
+                    result = (x > y) - (x < y)
+                    return -result if desc else result
+                return 0
+            self._sorted_cache = {k: v for k, v in self._sorted_cache.items() if k[0] != table}
+            self._sorted_cache[key] = sorted(rows, key=functools.cmp_to_key(compare))
+        return self._sorted_cache[key]
+    
+    def _execute(self, query: FakeQuery) -> FakeResponse:
+        self._sleep()
+        with self._lock:
+            self.calls[f'{query._op}:{query._table}'] += 1
+            rows = self.tables.setdefault(query._table, [])
+            
+            if query._op in ('insert', 'upsert'):
+                return self._write(query, rows)
+            
+            matches = [r for r in self._sorted(query._table, query._order) if all(f(r) for f in query._filters)]
+            if query._op == 'delete':
+                removed = {id(r) for r in matches}
+                self.tables[query._table] = [r for r in rows if id(r) not in removed]
+                self._changed(query._table)
+                return FakeResponse(matches)
+            if query._op == 'update':
+                for row in matches:
+                    row.update(query._payload)
+                self._changed(query._table)
+                self.rows_written[query._table] += len(matches)
+                return FakeResponse(matches)
+            
+            total = len(matches)
+            if query._range:
+                matches = matches[query._range[0]:query._range[1] + 1]
+            if query._limit is not None:
+                matches = matches[:query._limit]
+            if query._columns in ('count', ''):
+                data = []
+            else:
+                data = [self._project(query._table, query._columns, r) for r in matches]
+            return FakeResponse(data, total if query._count else None)
+    
+    def _write(self, query: FakeQuery, rows: List[Dict[str, Any]]) -> FakeResponse:
+        # Como o PostgREST (PGRST102): em lotes, todas as linhas precisam ter as mesmas chaves
+        keys = {frozenset(payload) for payload in query._payload}
+        if len(keys) > 1:
+            raise Exception(f"PGRST102: All object keys must match ({query._table})")
+        if query._op == 'upsert':
+            conflict = query._on_conflict
+            index = self._index(query._table, conflict)
+            # Outros índices da tabela ficariam desatualizados com as novas linhas
+            self._indexes = {k: v for k, v in self._indexes.items() if k[0] != query._table or k[1] == conflict}
+            for payload in query._payload:
+                existing = index.get(payload.get(conflict))
+                if existing is not None:
+                    existing.update(payload)
+                else:
+                    row = dict(payload)
+                    rows.append(row)
+                    index[row.get(conflict)] = row
+            self._changed(query._table, keep_indexes=True)
+        else:
+            rows.extend(dict(p) for p in query._payload)
+            self._changed(query._table)
+        self.rows_written[query._table] += len(query._payload)
+        return FakeResponse([])
+    
+    def _execute_rpc(self, name: str, params: Dict[str, Any]) -> FakeResponse:
+        self._sleep()
+        with self._lock:
+            self.calls[f'rpc:{name}'] += 1
+            if name == 'replace_device_components':
+                return self._replace_device_components(params['payload'])
+            if name == 'dashboard_stats':
+                return FakeResponse(self._dashboard_stats())
+            if name == 'refresh_site_rollups':
+                return FakeResponse(self._refresh_site_rollups(params.get('site_uids')))
+            raise Exception(f"Função {name} não existe no Supabase fake")
+    
+    def _replace_device_components(self, payload: List[Dict[str, Any]]) -> FakeResponse:
+        uids = {item['device_uid'] for item in payload}
+        components = [r for r in self.tables.get('device_components', []) if r.get('device_uid') not in uids]
+        fingerprints = {r['device_uid']: r for r in self.tables.get('device_component_fingerprints', [])}
+        for item in payload:
+            components.extend(dict(c) for c in item['components'])
+            fingerprints[item['device_uid']] = {
+                'device_uid': item['device_uid'],
+                'fingerprint': item['fingerprint'],
+                'component_count': len(item['components'])
+            }
+            self.rows_written['device_components'] += len(item['components'])
+        self.tables['device_components'] = components
+        self.tables['device_component_fingerprints'] = list(fingerprints.values())
+        self._changed('device_components')
+        self._changed('device_component_fingerprints')
+        return FakeResponse(len(payload))
+    
+    def _project(self, table: str, columns: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Colunas pedidas no select, incluindo embeds `alias:tabela(*)` das relações conhecidas."""
+        result: Dict[str, Any] = {}
+        for column in (c.strip() for c in _split(columns)):
+            embed = re.fullmatch(r'(?:(\w+):)?(\w+)\((.*)\)', column)
+            if embed:
+                alias, target, _ = embed.groups()
+                local, remote = EMBEDS[(table, target)]
+                related = self._index(target, remote).get(row.get(local))
+                result[alias or target] = dict(related) if related else None
+            elif column == '*':
+                result.update(row)
+            else:
+                result[column] = row.get(column)
+        return result
+    
+    def _refresh_site_rollups(self, site_uids: Optional[List[str]]) -> int:
+        wanted = set(site_uids) if site_uids is not None else None
+        devices = self.tables.get('devices', [])
+        site_of = {d.get('uid'): d.get('site_uid') for d in devices}
+        rollups = {}
+        for site in self.tables.get('sites', []):
+            if wanted is None or site.get('uid') in wanted:
+                rollups[site.get('uid')] = {
+                    'site_uid': site.get('uid'), 'total_devices': 0, 'devices_by_status': Counter(),
+                    'open_alerts': 0, 'open_alerts_by_severity': Counter(), 'last_seen_max': None
+                }
+        for device in devices:
+            rollup = rollups.get(device.get('site_uid'))
+            if rollup is not None:
+                rollup['total_devices'] += 1
+                rollup['devices_by_status'][device.get('status') or 'unknown'] += 1
+                if device.get('last_seen') and (rollup['last_seen_max'] or '') < device['last_seen']:
+                    rollup['last_seen_max'] = device['last_seen']
+        for alert in self.tables.get('alerts', []):
+            rollup = rollups.get(site_of.get(alert.get('device_uid')))
+            if rollup is not None and alert.get('status') != 'resolved':
+                rollup['open_alerts'] += 1
+                rollup['open_alerts_by_severity'][alert.get('severity') or 'unknown'] += 1
+        
+        existing = self._index('site_rollups', 'site_uid')
+        table = self.tables.setdefault('site_rollups', [])
+        if wanted is None:
+            # Sites removidos saem junto (ON DELETE CASCADE na tabela real)
+            table[:] = [r for r in table if r['site_uid'] in rollups]
+        changed = 0
+        for uid, rollup in rollups.items():
+            rollup = {**rollup, 'devices_by_status': dict(rollup['devices_by_status']),
+                      'open_alerts_by_severity': dict(rollup['open_alerts_by_severity'])}
+            current = existing.get(uid)
+            if current is None:
+                table.append(rollup)
+            elif current != rollup:
+                current.update(rollup)
+            else:
+                continue
+            changed += 1
+        self.rows_written['site_rollups'] += changed
+        self._changed('site_rollups')
+        return changed
+    
+    def _dashboard_stats(self) -> Dict[str, Any]:
+        def by_status(table):
+            counts = Counter(r.get('status') or 'unknown' for r in self.tables.get(table, []))
+            return {'total': sum(counts.values()), 'by_status': dict(counts)}
+        return {
+            'devices': by_status('devices'),
+            'alerts': by_status('alerts'),
+            'sites': {'total': len(self.tables.get('sites', []))}
+        }
+
+
+def install(client: FakeSupabaseClient) -> None:
+    """Faz todo SupabaseManager criado a partir daqui usar o cliente fake."""
+    import supabase_client
+    supabase_client.create_client = lambda *args, **kwargs: client
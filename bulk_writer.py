@@ -0,0 +1,109 @@
+import os
+import json
+import asyncio
+from typing import Dict, List, Any, Optional
+from postgrest.types import ReturnMethod
+
+
+class BulkWriter:
+    """Acumula linhas por tabela e grava no Supabase em lotes limitados."""
+    
+    def __init__(self, supabase, max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                 concurrency: Optional[int] = None):
+        self.supabase = supabase
+        self.max_rows = max_rows or int(os.getenv("SUPABASE_BATCH_ROWS", "500"))
+        self.max_bytes = max_bytes or int(os.getenv("SUPABASE_BATCH_BYTES", "1000000"))
+        self.concurrency = max(1, concurrency or int(os.getenv("SUPABASE_BATCH_CONCURRENCY", "4")))
+        
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._buffer_bytes: Dict[str, int] = {}
+        self._on_conflict: Dict[str, Optional[str]] = {}
+        # Buffers enviados como argumento de uma função RPC (nome da função -> parâmetro)
+        self._rpc_params: Dict[str, str] = {}
+        self._pending: set = set()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Lotes com falha por tabela desde o último flush dela
+        self._failures: Dict[str, int] = {}
+        
+        self.stats = {'rows': 0, 'chunks': 0, 'failed_rows': 0, 'failed_chunks': 0}
+    
+    async def __aenter__(self) -> "BulkWriter":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.flush()
+    
+    async def add(self, table_name: str, rows: List[Dict[str, Any]], on_conflict: Optional[str] = None) -> None:
+        """Adiciona linhas ao buffer da tabela, enviando lotes quando os limites são atingidos."""
+        if self._on_conflict.get(table_name, on_conflict) != on_conflict:
+            await self._dispatch(table_name)
+        self._on_conflict[table_name] = on_conflict
+        
+        buffer = self._buffers.setdefault(table_name, [])
+        for row in rows:
+            size = len(json.dumps(row, default=str))
+            if buffer and self._buffer_bytes.get(table_name, 0) + size > self.max_bytes:
+                await self._dispatch(table_name)
+                buffer = self._buffers.setdefault(table_name, [])
+            buffer.append(row)
+            self._buffer_bytes[table_name] = self._buffer_bytes.get(table_name, 0) + size
+            if len(buffer) >= self.max_rows:
+                await self._dispatch(table_name)
+                buffer = self._buffers.setdefault(table_name, [])
+    
+    async def add_rpc(self, function_name: str, items: List[Dict[str, Any]], param: str = 'payload') -> None:
+        """Acumula itens enviados em lotes como argumento de uma função RPC (ex.: substituição atômica)."""
+        self._rpc_params[function_name] = param
+        await self.add(function_name, items)
+    
+    async def flush(self, table_name: Optional[str] = None) -> bool:
+        """Envia o que restou nos buffers e aguarda os lotes pendentes. Retorna False se algum lote falhou."""
+        tables = [table_name] if table_name else list(self._buffers)
+        for table in tables:
+            await self._dispatch(table)
+        
+        if self._pending:
+            await asyncio.gather(*list(self._pending))
+        
+        # Falhas acumuladas desde o último flush das tabelas, inclusive de lotes já concluídos
+        failed = [self._failures.pop(table, 0) for table in (tables if table_name else list(self._failures))]
+        return not any(failed)
+    
+    async def _dispatch(self, table_name: str) -> None:
+        """Retira o buffer atual da tabela e agenda o envio, respeitando o limite de envios simultâneos."""
+        rows = self._buffers.pop(table_name, None)
+        self._buffer_bytes.pop(table_name, None)
+        if not rows:
+            return
+        
+        # Aguarda uma vaga antes de agendar: limita a memória retida em lotes pendentes
+        await self._semaphore.acquire()
+        task = asyncio.create_task(self._upload(table_name, rows, self._on_conflict.get(table_name)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        # Libera a vaga ao terminar de qualquer forma, inclusive cancelada antes de começar a executar
+        task.add_done_callback(lambda _: self._semaphore.release())
+    
+    async def _upload(self, table_name: str, rows: List[Dict[str, Any]], on_conflict: Optional[str]) -> bool:
+        """Envia um lote para o Supabase sem bloquear o loop de eventos."""
+        try:
+            rpc_param = self._rpc_params.get(table_name)
+            if rpc_param:
+                query = self.supabase.client.rpc(table_name, {rpc_param: rows})
+            elif on_conflict:
+                query = self.supabase.client.table(table_name).upsert(
+                    rows, on_conflict=on_conflict, returning=ReturnMethod.minimal
+                )
+            else:
+                query = self.supabase.client.table(table_name).insert(rows, returning=ReturnMethod.minimal)
+            await self.supabase.execute(query)
+            
+            self.stats['rows'] += len(rows)
+            self.stats['chunks'] += 1
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao gravar lote de {len(rows)} registros na tabela {table_name}: {e}")
+            self.stats['failed_rows'] += len(rows)
+            self.stats['failed_chunks'] += 1
+            self._failures[table_name] = self._failures.get(table_name, 0) + 1
+            return False
@@ -0,0 +1,166 @@
+import os
+import json
+import gzip
+import time
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional
+
+
+class CircuitOpenError(Exception):
+    """O circuito está aberto: a API é considerada indisponível e a chamada nem é feita."""
+
+
+class CircuitBreaker:
+    """Circuit breaker: abre após falhas consecutivas e testa a recuperação com uma chamada (meio-aberto)."""
+    
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, name: str, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 probe_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold or int(os.getenv("DATTO_CIRCUIT_FAILURES", "5")))
+        self.reset_timeout = reset_timeout or float(os.getenv("DATTO_CIRCUIT_RESET_TIMEOUT", "60"))
+        # Sonda sem veredito há mais que isso é considerada perdida e outra é liberada
+        self.probe_timeout = probe_timeout or float(os.getenv("DATTO_CIRCUIT_PROBE_TIMEOUT", "120"))
+        
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        # Compartilhado entre coletores de loops/threads diferentes no mesmo processo
+        self._lock = threading.Lock()
+        
+        self.stats = {'opened': 0, 'rejected': 0, 'probes': 0}
+    
+    def allow(self) -> bool:
+        """Indica se a chamada pode seguir. No estado meio-aberto, libera uma única sonda por vez."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._probe_in_flight and \
+                    time.monotonic() - self._probe_started >= self.probe_timeout:
+                print(f"⚠️  Circuito {self.name}: sonda sem resposta há {self.probe_timeout:.0f}s; liberando outra")
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_started = time.monotonic()
+                self.stats['probes'] += 1
+                return True
+            
+            self.stats['rejected'] += 1
+            return False
+    
+    @property
+    def is_open(self) -> bool:
+        """Circuito aberto e ainda dentro do intervalo sem sondas."""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout
+    
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"✅ Circuito {self.name} fechado: API respondendo novamente")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+                self.stats['opened'] += 1
+                print(f"🔌 Circuito {self.name} aberto após {self._failures} falhas; nova sonda em {self.reset_timeout:.0f}s")
+    
+    def release_probe(self) -> None:
+        """Libera a sonda sem veredito (ex.: 4xx, 429 ou requisição cancelada, que não indicam indisponibilidade)."""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def snapshot(self) -> Dict[str, Any]:
+        return {'name': self.name, 'state': self.state, 'failures': self._failures,
+                'probe_in_flight': self._probe_in_flight, **self.stats}
+
+
+class LastGoodWriter:
+    """Grava uma coleta página a página em um arquivo temporário e a publica de forma atômica (rename)."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.count = 0
+        self._file = gzip.open(self.tmp_path, 'wt', encoding='utf-8')
+        # Mesmo formato de um json.dump({'saved_at', 'records'}), escrito aos poucos
+        saved_at = datetime.now(timezone.utc).isoformat()
+        self._file.write('{"saved_at": ' + json.dumps(saved_at) + ', "records": [')
+    
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if not records:
+            return
+        # Uma escrita por página: json.dump direto no arquivo gzip faz uma escrita por token
+        chunk = ','.join(json.dumps(record, default=str) for record in records)
+        self._file.write(',' + chunk if self.count else chunk)
+        self.count += len(records)
+    
+    def commit(self) -> None:
+        """Substitui a coleta anterior pela gravada."""
+        self._file.write(']}')
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+    
+    def discard(self) -> None:
+        """Abandona a gravação (coleta incompleta): a coleta anterior continua valendo."""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class LastGoodStore:
+    """Guarda em disco a última coleta completa de cada endpoint, usada quando a API está indisponível."""
+    
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("DATTO_LAST_GOOD_DIR", "data/last_good")
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace('/', '_') + '.json.gz')
+    
+    def begin(self, key: str) -> LastGoodWriter:
+        """Inicia a gravação incremental de uma coleta, sem manter os registros em memória."""
+        os.makedirs(self.directory, exist_ok=True)
+        return LastGoodWriter(self._path(key))
+    
+    def save(self, key: str, records: List[Dict[str, Any]]) -> None:
+        """Grava os registros de forma atômica (arquivo temporário + rename)."""
+        writer = self.begin(key)
+        try:
+            writer.write(records)
+            writer.commit()
+        except BaseException:
+            writer.discard()
+            raise
+    
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna {'saved_at', 'records'} ou None se não houver coleta guardada."""
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️  Última coleta de {key} ilegível: {e}")
+            return None
+
+
+# Estado da API Datto compartilhado por todos os coletores do processo
+datto_circuit = CircuitBreaker('datto')
@@ -2,274 +2,683 @@ import os
 import asyncio
 import aiohttp
 import json
-from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional
+import time
+import hashlib
+from urllib.parse import urlsplit
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Any, Optional, AsyncIterator, Callable, Tuple
 from dotenv import load_dotenv
 from supabase_client import SupabaseManager
+from bulk_writer import BulkWriter
+from rate_limiter import datto_rate_limiter, RateLimitExceeded, backoff_delay, parse_retry_after
+from circuit_breaker import datto_circuit, CircuitOpenError, LastGoodStore, LastGoodWriter
+from response_cache import ResponseCache
+from fleet_snapshot import fleet_snapshot
+from metrics import datto_requests, datto_request_duration, datto_response_bytes, sync_phase_duration
 
 load_dotenv()
 
+# Tabelas sincronizadas por uid (upsert incremental ou substituição completa)
+INCREMENTAL_TABLES = ('sites', 'devices', 'alerts')
+
+# Campos gerados localmente a cada coleta, fora do hash de conteúdo
+VOLATILE_FIELDS = {
+    'sites': {'created_at'},
+    'devices': {'created_at'},
+    'device_components': {'created_at'},
+}
+
+# Limite de linhas por leitura no PostgREST e de uids por filtro ... IN (...)
+SUPABASE_READ_PAGE_SIZE = 1000
+UID_BATCH_SIZE = 500
+
+# Entidades coletadas por diferença a partir da marca d'água (última sincronização)
+DELTA_TABLES = ('devices', 'alerts')
+SYNC_STATE_TABLE = 'sync_state'
+
+# Impressão digital do conjunto de componentes de cada dispositivo e a função
+# que substitui os componentes de vários dispositivos em uma única transação
+COMPONENT_FINGERPRINTS_TABLE = 'device_component_fingerprints'
+REPLACE_COMPONENTS_RPC = 'replace_device_components'
+
+# Respostas da API Datto que valem nova tentativa
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Estatísticas em tempo real: chave do total e do número de registros em cada status
+REALTIME_COUNTERS = {
+    'devices': ('total_devices', {'online': 'online_devices', 'offline': 'offline_devices'}),
+    'alerts': ('total_alerts', {'new': 'new_alerts'}),
+    'sites': ('total_sites', {}),
+}
+
+# Dados mock para desenvolvimento (usados apenas sem chaves da API configuradas)
+MOCK_SITES = [
+    {
+        "uid": "site-001",
+        "name": "Matriz - São Paulo",
+        "address": "Rua das Flores, 123 - São Paulo/SP",
+        "status": "active",
+        "device_count": 15
+    },
+    {
+        "uid": "site-002", 
+        "name": "Filial - Rio de Janeiro",
+        "address": "Av. Copacabana, 456 - Rio de Janeiro/RJ",
+        "status": "active",
+        "device_count": 8
+    },
+    {
+        "uid": "site-003",
+        "name": "Filial - Belo Horizonte", 
+        "address": "Rua da Liberdade, 789 - Belo Horizonte/MG",
+        "status": "active",
+        "device_count": 12
+    }
+]
+
+MOCK_DEVICES = [
+    {
+        "uid": "dev-001",
+        "hostname": "server-sp-01",
+        "site_uid": "site-001",
+        "status": "online",
+        "ip_address": "192.168.1.100",
+        "last_seen": "2024-01-15T10:30:00Z",
+        "os": "Windows Server 2019",
+        "memory": "16GB",
+        "cpu": "Intel Xeon"
+    },
+    {
+        "uid": "dev-002",
+        "hostname": "workstation-rj-01", 
+        "site_uid": "site-002",
+        "status": "online",
+        "ip_address": "192.168.2.50",
+        "last_seen": "2024-01-15T10:25:00Z",
+        "os": "Windows 11",
+        "memory": "8GB",
+        "cpu": "Intel i5"
+    },
+    {
+        "uid": "dev-003",
+        "hostname": "server-bh-01",
+        "site_uid": "site-003", 
+        "status": "offline",
+        "ip_address": "192.168.3.75",
+        "last_seen": "2024-01-15T09:45:00Z",
+        "os": "Ubuntu 20.04",
+        "memory": "32GB",
+        "cpu": "AMD EPYC"
+    },
+    {
+        "uid": "dev-004",
+        "hostname": "workstation-sp-02",
+        "site_uid": "site-001",
+        "status": "online", 
+        "ip_address": "192.168.1.101",
+        "last_seen": "2024-01-15T10:28:00Z",
+        "os": "Windows 10",
+        "memory": "16GB",
+        "cpu": "Intel i7"
+    },
+    {
+        "uid": "dev-005",
+        "hostname": "server-rj-01",
+        "site_uid": "site-002",
+        "status": "online",
+        "ip_address": "192.168.2.100", 
+        "last_seen": "2024-01-15T10:32:00Z",
+        "os": "Windows Server 2022",
+        "memory": "64GB",
+        "cpu": "Intel Xeon"
+    }
+]
+
+MOCK_ALERTS = [
+    {
+        "uid": "alert-001",
+        "device_uid": "dev-003",
+        "alert_type": "device_offline",
+        "severity": "high",
+        "status": "new",
+        "message": "Dispositivo server-bh-01 está offline há mais de 30 minutos",
+        "created_at": "2024-01-15T09:45:00Z"
+    },
+    {
+        "uid": "alert-002",
+        "device_uid": "dev-001", 
+        "alert_type": "high_cpu_usage",
+        "severity": "medium",
+        "status": "new",
+        "message": "CPU usage acima de 90% no servidor server-sp-01",
+        "created_at": "2024-01-15T10:15:00Z"
+    },
+    {
+        "uid": "alert-003",
+        "device_uid": "dev-004",
+        "alert_type": "low_disk_space",
+        "severity": "low", 
+        "status": "resolved",
+        "message": "Espaço em disco baixo no workstation-sp-02",
+        "created_at": "2024-01-15T09:30:00Z"
+    },
+    {
+        "uid": "alert-004",
+        "device_uid": "dev-002",
+        "alert_type": "security_update",
+        "severity": "medium",
+        "status": "new",
+        "message": "Atualizações de segurança pendentes no workstation-rj-01",
+        "created_at": "2024-01-15T10:00:00Z"
+    }
+]
+
+def _count_records(table_name: str, records: List[Dict[str, Any]],
+                   counters: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Acumula os contadores do dashboard de uma entidade em uma única passada pelos registros."""
+    total_key, status_keys = REALTIME_COUNTERS[table_name]
+    if counters is None:
+        counters = dict.fromkeys([total_key, *status_keys.values()], 0)
+    counters[total_key] += len(records)
+    if status_keys:
+        for status, count in Counter(record.get('status') for record in records).items():
+            if status in status_keys:
+                counters[status_keys[status]] += count
+    return counters
+
 class DataCollector:
     def __init__(self):
         self.api_key = os.getenv("DATTO_API_KEY")
         self.api_secret = os.getenv("DATTO_API_SECRET")
-        self.base_url = "https://centraapi.centrastage.net/api/v2"
+        # URL da plataforma Datto da conta (ex.: pinotage, merlot) ou de um servidor fake nos benchmarks
+        self.base_url = os.getenv("DATTO_API_URL", "https://centraapi.centrastage.net/api/v2").rstrip("/")
         self.supabase = SupabaseManager()
+        self.writer = BulkWriter(self.supabase)
         
-        if not self.api_key or not self.api_secret:
+        # Pool de conexões HTTP compartilhado por todas as coletas
+        self.pool_limit = int(os.getenv("DATTO_HTTP_POOL_LIMIT", "100"))
+        self.pool_limit_per_host = int(os.getenv("DATTO_HTTP_POOL_LIMIT_PER_HOST", "20"))
+        self.dns_cache_ttl = int(os.getenv("DATTO_HTTP_DNS_CACHE_TTL", "300"))
+        self.keepalive_timeout = float(os.getenv("DATTO_HTTP_KEEPALIVE_TIMEOUT", "30"))
+        self.request_timeout = float(os.getenv("DATTO_HTTP_TIMEOUT", "30"))
+        self.connect_timeout = float(os.getenv("DATTO_HTTP_CONNECT_TIMEOUT", "10"))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._prefetch_tasks: set = set()
+        
+        # Cota de requisições (token bucket compartilhado) e novas tentativas com backoff
+        self.rate_limiter = datto_rate_limiter
+        self.max_retries = int(os.getenv("DATTO_MAX_RETRIES", "4"))
+        self.backoff_base = float(os.getenv("DATTO_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.getenv("DATTO_BACKOFF_MAX", "30"))
+        self.request_stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0, 'not_modified': 0}
+        
+        # Circuit breaker da API e última coleta completa guardada em disco (usada nas falhas)
+        self.circuit = datto_circuit
+        self.last_good = LastGoodStore()
+        self.fallback_collections: Dict[str, str] = {}
+        
+        # Cache em disco das respostas (ETag/Last-Modified) para requisições condicionais
+        self.response_cache = ResponseCache()
+        
+        # Número máximo de dispositivos com componentes coletados em paralelo
+        self.component_concurrency = max(1, int(os.getenv("DATTO_COMPONENT_CONCURRENCY", "10")))
+        
+        # Paginação dos endpoints de listagem
+        self.page_size = int(os.getenv("DATTO_PAGE_SIZE", "250"))
+        self.page_prefetch = os.getenv("DATTO_PAGE_PREFETCH", "true").lower() == "true"
+        
+        # Modo de gravação: 'upsert' (incremental por uid) ou 'replace' (apaga e reinsere)
+        self.sync_mode = os.getenv("SYNC_MODE", "upsert").lower()
+        self.last_sync_stats: Dict[str, Dict[str, Any]] = {}
+        self.incomplete_collections: set = set()
+        
+        # Sincronização delta: só registros alterados desde a marca d'água, com
+        # reconciliação completa periódica (que também remove os ausentes)
+        self.delta_enabled = os.getenv("SYNC_DELTA_ENABLED", "true").lower() == "true"
+        self.delta_param = os.getenv("DATTO_DELTA_PARAM", "changedSince")
+        self.full_reconcile_interval = timedelta(hours=float(os.getenv("SYNC_FULL_RECONCILE_HOURS", "24")))
+        self.watermark_overlap = timedelta(seconds=float(os.getenv("SYNC_WATERMARK_OVERLAP_SECONDS", "300")))
+        self.force_full = False
+        self.watermarks: Dict[str, Dict[str, Any]] = {}
+        
+        # Frota em memória (espelho do que foi gravado), compartilhada com as rotas; as
+        # estatísticas em tempo real a usam enquanto tiver até REALTIME_SNAPSHOT_MAX_AGE segundos
+        self.fleet = fleet_snapshot
+        self.realtime_max_age = float(os.getenv("REALTIME_SNAPSHOT_MAX_AGE", "120"))
+        
+        # Callback opcional (fase, detalhes) chamado a cada etapa de collect_all_data
+        self.progress_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        self._components_done = 0
+        self._components_total = 0
+        # Fase atual e seu início (perf_counter), para sync_phase_duration_seconds
+        self._phase: Optional[str] = None
+        self._phase_started = 0.0
+        
+        # Sem chaves configuradas (desenvolvimento), as coletas usam os dados mock
+        self.use_mock_data = not self.api_key or not self.api_secret
+        if self.use_mock_data:
             print("⚠️  AVISO: Chaves da API Datto não configuradas")
             print("Configure DATTO_API_KEY e DATTO_API_SECRET no arquivo .env")
     
-    async def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
+    def _report_progress(self, phase: str, **details) -> None:
+        """Informa a fase atual da coleta ao callback registrado (ex.: agendador de sincronização)."""
+        if phase != self._phase:
+            now = time.perf_counter()
+            if self._phase is not None:
+                sync_phase_duration.observe(now - self._phase_started, phase=self._phase)
+            self._phase, self._phase_started = phase, now
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(phase, details)
+        except Exception as e:
+            print(f"⚠️  Erro no callback de progresso: {e}")
+    
+    async def __aenter__(self) -> "DataCollector":
+        await self._get_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Retorna a sessão HTTP do coletor, criando o pool na primeira chamada."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.request_timeout,
+                sock_connect=self.connect_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                },
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """Fecha a sessão HTTP e libera as conexões do pool."""
+        # Páginas pré-carregadas de iterações abandonadas não devem reabrir a sessão
+        for task in list(self._prefetch_tasks):
+            task.cancel()
+        self._prefetch_tasks.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def _make_request(self, endpoint: str, params: Dict = None, use_cache: bool = True) -> Optional[Dict]:
         """Faz uma requisição para a API do Datto."""
+        data, _ = await self._make_conditional_request(endpoint, params, use_cache)
+        return data
+    
+    async def _make_conditional_request(self, endpoint: str, params: Dict = None,
+                                        use_cache: bool = True) -> Tuple[Optional[Dict], bool]:
+        """Faz uma requisição para a API do Datto, retornando (dados, não_modificado).
+        
+        Com uma resposta anterior em cache, envia If-None-Match/If-Modified-Since e,
+        diante de um 304, devolve o corpo guardado com não_modificado=True.
+        Respeita a cota do token bucket, repete erros transitórios (429, 5xx, rede)
+        com backoff exponencial e jitter, e levanta RateLimitExceeded se o 429 persistir.
+        Com o circuito aberto, levanta CircuitOpenError sem chamar a API.
+        """
         if not self.api_key or not self.api_secret:
             print(f"❌ Erro: Chaves da API Datto não configuradas")
-            return None
+            return None, False
         
-        url = f"{self.base_url}/{endpoint}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        # Links de paginação (nextPageUrl) já chegam como URL absoluta
+        if endpoint.startswith(("http://", "https://")):
+            url = endpoint
+        else:
+            url = f"{self.base_url}/{endpoint}"
+        label = _endpoint_label(url, self.base_url)
+        
+        cache_key = self.response_cache.make_key(url, params) if use_cache and self.response_cache.enabled else None
+        cached = await asyncio.to_thread(self.response_cache.get, cache_key) if cache_key else None
+        headers = ResponseCache.conditional_headers(cached)
+        
+        session = await self._get_session()
+        for attempt in range(self.max_retries + 1):
+            if not self.circuit.allow():
+                self.request_stats['failed'] += 1
+                raise CircuitOpenError(f"API Datto indisponível (circuito aberto); {endpoint} não consultado")
+            
+            await self.rate_limiter.acquire()
+            self.request_stats['requests'] += 1
+            retry_after = None
+            status = None
+            received = 0
+            started = time.perf_counter()
+            try:
+                async with session.get(url, params=params, headers=headers) as response:
+                    status = response.status
+                    if status == 304 and cached is not None:
+                        self.circuit.record_success()
+                        self.request_stats['not_modified'] += 1
+                        return cached['body'], True
+                    if status == 200:
+                        received = len(await response.read())
+                        data = await response.json()
+                        self.circuit.record_success()
+                        if cache_key:
+                            await self._store_response(cache_key, data, response.headers)
+                        return data, False
+                    if status not in RETRYABLE_STATUSES:
+                        # Erros 4xx: a API está no ar, o problema é da requisição
+                        self.circuit.record_success()
+                        print(f"❌ Erro na API Datto: {status} - {await response.text()}")
+                        self.request_stats['failed'] += 1
+                        return None, False
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    error = f"HTTP {status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            except Exception as e:
+                self.circuit.release_probe()
+                print(f"❌ Erro ao fazer requisição para {endpoint}: {e}")
+                self.request_stats['failed'] += 1
+                return None, False
+            except BaseException:
+                # Cancelada (job cancelado, pré-carga descartada, close()): sem veredito, mas uma
+                # sonda do circuito meio-aberto não pode ficar presa
+                self.circuit.release_probe()
+                raise
+            finally:
+                datto_request_duration.observe(time.perf_counter() - started, endpoint=label)
+                datto_requests.inc(endpoint=label, status=status or 'error')
+                if received:
+                    datto_response_bytes.inc(received, endpoint=label)
+            
+            if status == 429:
+                self.circuit.release_probe()
+            else:
+                self.circuit.record_failure()
+            
+            delay = retry_after if retry_after is not None else backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            if status == 429:
+                # Cota esgotada: pausa todas as requisições do processo, não só esta
+                self.request_stats['rate_limited'] += 1
+                self.rate_limiter.pause(delay)
+            
+            if attempt == self.max_retries:
+                break
+            
+            self.request_stats['retries'] += 1
+            print(f"⏳ {endpoint}: {error}; nova tentativa {attempt + 1}/{self.max_retries} em {delay:.1f}s")
+            if status != 429:
+                await asyncio.sleep(delay)
+        
+        self.request_stats['failed'] += 1
+        if status == 429:
+            raise RateLimitExceeded(f"Cota da API Datto esgotada em {endpoint}")
+        print(f"❌ Erro ao fazer requisição para {endpoint}: {error}")
+        return None, False
+    
+    async def _store_response(self, cache_key: str, data: Any, headers) -> None:
+        """Guarda a resposta no cache HTTP se ela trouxer ETag ou Last-Modified."""
+        try:
+            await asyncio.to_thread(
+                self.response_cache.set, cache_key, data, headers.get("ETag"), headers.get("Last-Modified")
+            )
+        except Exception as e:
+            print(f"⚠️  Não foi possível guardar a resposta no cache HTTP: {e}")
+    
+    async def _paginate(self, endpoint: str, params: Dict = None, mock_data: List[Dict] = None,
+                        prefetch: Optional[bool] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre um endpoint paginado do Datto, retornando os registros página a página.
+        
+        Coletas completas (sem filtros) são guardadas como última coleta válida e
+        reaproveitadas quando a API falha ou o circuito está aberto.
+        """
+        if prefetch is None:
+            prefetch = self.page_prefetch
+        
+        self.incomplete_collections.discard(endpoint)
+        self.fallback_collections.pop(endpoint, None)
+        full_collection = not params
+        params = {"max": self.page_size, **(params or {})}
+        try:
+            data = await self._make_request(endpoint, params, use_cache=full_collection)
+        except RateLimitExceeded as e:
+            # Limite de requisições não é indisponibilidade: nada de dados substitutos
+            print(f"🚦 {e}; coleta de {endpoint} adiada")
+            self.incomplete_collections.add(endpoint)
+            return
+        except CircuitOpenError as e:
+            print(f"🔌 {e}")
+            data = None
         
+        if data is None:
+            # Dados substitutos não representam o inventário atual: nada deve ser removido com base neles
+            self.incomplete_collections.add(endpoint)
+            fallback = await self._fallback_records(endpoint, mock_data, full_collection)
+            if fallback:
+                yield fallback
+            return
+        
+        # Coletas completas vão para o disco página a página, sem uma cópia da coleta em memória
+        last_good = await self._begin_last_good(endpoint) if full_collection else None
+        page = 0
+        next_task: Optional[asyncio.Task] = None
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
+            while True:
+                next_url = (data.get("pageDetails") or {}).get("nextPageUrl")
+                
+                # Busca a próxima página enquanto a atual é processada
+                if prefetch and next_url:
+                    next_task = asyncio.create_task(self._make_request(next_url, use_cache=full_collection))
+                    self._prefetch_tasks.add(next_task)
+                    next_task.add_done_callback(self._prefetch_tasks.discard)
+                
+                records = data.get("data", [])
+                if last_good is not None:
+                    try:
+                        await asyncio.to_thread(last_good.write, records)
+                    except Exception as e:
+                        print(f"⚠️  Não foi possível guardar a última coleta de {endpoint}: {e}")
+                        last_good.discard()
+                        last_good = None
+                yield records
+                page += 1
+                
+                if not next_url:
+                    break
+                
+                try:
+                    if next_task is not None:
+                        task, next_task = next_task, None
+                        data = await task
                     else:
-                        print(f"❌ Erro na API Datto: {response.status} - {await response.text()}")
-                        return None
+                        data = await self._make_request(next_url, use_cache=full_collection)
+                except (RateLimitExceeded, CircuitOpenError) as e:
+                    print(f"⚠️  {e}")
+                    data = None
+                
+                if data is None:
+                    print(f"⚠️  Falha ao obter a página {page + 1} de {endpoint}; coleta interrompida")
+                    self.incomplete_collections.add(endpoint)
+                    break
+            
+            if last_good is not None and endpoint not in self.incomplete_collections:
+                try:
+                    await asyncio.to_thread(last_good.commit)
+                except Exception as e:
+                    print(f"⚠️  Não foi possível guardar a última coleta de {endpoint}: {e}")
+                    last_good.discard()
+                last_good = None
+        finally:
+            if next_task is not None and not next_task.done():
+                next_task.cancel()
+            if last_good is not None:
+                # Coleta interrompida ou abandonada: a última coleta válida anterior continua valendo
+                last_good.discard()
+    
+    async def _begin_last_good(self, endpoint: str) -> Optional[LastGoodWriter]:
+        try:
+            return await asyncio.to_thread(self.last_good.begin, endpoint)
         except Exception as e:
-            print(f"❌ Erro ao fazer requisição para {endpoint}: {e}")
+            print(f"⚠️  Não foi possível guardar a última coleta de {endpoint}: {e}")
             return None
     
+    async def _fallback_records(self, endpoint: str, mock_data: Optional[List[Dict]],
+                                full_collection: bool) -> List[Dict[str, Any]]:
+        """Registros usados quando a API falha: mock sem chaves configuradas, senão a última coleta válida."""
+        if self.use_mock_data:
+            return list(mock_data or [])
+        if not full_collection:
+            # Coleta delta: a marca d'água não avança e a próxima execução recupera o intervalo
+            return []
+        
+        stored = await asyncio.to_thread(self.last_good.load, endpoint)
+        if not stored:
+            print(f"⚠️  Nenhuma coleta anterior de {endpoint} guardada; nada a processar")
+            return []
+        
+        self.fallback_collections[endpoint] = stored['saved_at']
+        print(f"♻️  Usando a última coleta de {endpoint} ({len(stored['records'])} registros, de {stored['saved_at']})")
+        return stored['records']
+    
+    def _transform_site(self, site: Dict[str, Any], created_at: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "uid": site.get("uid"),
+            "name": site.get("name"),
+            "address": site.get("address"),
+            "status": site.get("status", "active"),
+            "device_count": site.get("device_count", 0),
+            "created_at": created_at or _now_iso()
+        }
+    
+    def _transform_device(self, device: Dict[str, Any], created_at: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "uid": device.get("uid"),
+            "hostname": device.get("hostname"),
+            "site_uid": device.get("site_uid"),
+            "status": device.get("status", "unknown"),
+            "ip_address": device.get("ip_address"),
+            "last_seen": device.get("last_seen"),
+            "os": device.get("os"),
+            "memory": device.get("memory"),
+            "cpu": device.get("cpu"),
+            "created_at": created_at or _now_iso()
+        }
+    
+    def _transform_alert(self, alert: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "uid": alert.get("uid"),
+            "device_uid": alert.get("device_uid"),
+            "alert_type": alert.get("alert_type"),
+            "severity": alert.get("severity", "low"),
+            "status": alert.get("status", "new"),
+            "message": alert.get("message"),
+            "created_at": alert.get("created_at")
+        }
+    
+    async def iter_sites(self, prefetch: Optional[bool] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre os sites do Datto página a página."""
+        async for page in self._paginate("sites", mock_data=MOCK_SITES, prefetch=prefetch):
+            # Um único carimbo de data por página (campo volátil, fora do hash de conteúdo)
+            created_at = _now_iso()
+            yield [self._transform_site(site, created_at) for site in page]
+    
+    async def iter_devices(self, prefetch: Optional[bool] = None,
+                         since: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre os dispositivos do Datto página a página (apenas os alterados após `since`, se informado)."""
+        params = {self.delta_param: since} if since else None
+        async for page in self._paginate("devices", params, mock_data=MOCK_DEVICES, prefetch=prefetch):
+            created_at = _now_iso()
+            yield [self._transform_device(device, created_at) for device in page]
+    
+    async def iter_alerts(self, prefetch: Optional[bool] = None,
+                         since: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre os alertas do Datto página a página (apenas os alterados após `since`, se informado)."""
+        params = {self.delta_param: since} if since else None
+        async for page in self._paginate("alerts", params, mock_data=MOCK_ALERTS, prefetch=prefetch):
+            yield [self._transform_alert(alert) for alert in page]
+    
     async def collect_sites(self) -> List[Dict[str, Any]]:
         """Coleta dados dos sites do Datto."""
         print("🔍 Coletando sites...")
         
         try:
-            # Simula dados de sites (substitua pela API real do Datto)
-            sites_data = await self._make_request("sites")
-            
-            if not sites_data:
-                # Dados mock para desenvolvimento
-                sites_data = {
-                    "data": [
-                        {
-                            "uid": "site-001",
-                            "name": "Matriz - São Paulo",
-                            "address": "Rua das Flores, 123 - São Paulo/SP",
-                            "status": "active",
-                            "device_count": 15
-                        },
-                        {
-                            "uid": "site-002", 
-                            "name": "Filial - Rio de Janeiro",
-                            "address": "Av. Copacabana, 456 - Rio de Janeiro/RJ",
-                            "status": "active",
-                            "device_count": 8
-                        },
-                        {
-                            "uid": "site-003",
-                            "name": "Filial - Belo Horizonte", 
-                            "address": "Rua da Liberdade, 789 - Belo Horizonte/MG",
-                            "status": "active",
-                            "device_count": 12
-                        }
-                    ]
-                }
-            
             sites = []
-            for site in sites_data.get("data", []):
-                site_data = {
-                    "uid": site.get("uid"),
-                    "name": site.get("name"),
-                    "address": site.get("address"),
-                    "status": site.get("status", "active"),
-                    "device_count": site.get("device_count", 0),
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                sites.append(site_data)
+            async for page in self.iter_sites():
+                sites.extend(page)
             
             print(f"✅ {len(sites)} sites coletados")
             return sites
-            
+        
         except Exception as e:
             print(f"❌ Erro ao coletar sites: {e}")
             return []
     
-    async def collect_devices(self) -> List[Dict[str, Any]]:
+    async def collect_devices(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
         """Coleta dados dos dispositivos do Datto."""
-        print("🔍 Coletando dispositivos...")
+        print(f"🔍 Coletando dispositivos{f' alterados desde {since}' if since else ''}...")
         
         try:
-            # Simula dados de dispositivos (substitua pela API real do Datto)
-            devices_data = await self._make_request("devices")
-            
-            if not devices_data:
-                # Dados mock para desenvolvimento
-                devices_data = {
-                    "data": [
-                        {
-                            "uid": "dev-001",
-                            "hostname": "server-sp-01",
-                            "site_uid": "site-001",
-                            "status": "online",
-                            "ip_address": "192.168.1.100",
-                            "last_seen": "2024-01-15T10:30:00Z",
-                            "os": "Windows Server 2019",
-                            "memory": "16GB",
-                            "cpu": "Intel Xeon"
-                        },
-                        {
-                            "uid": "dev-002",
-                            "hostname": "workstation-rj-01", 
-                            "site_uid": "site-002",
-                            "status": "online",
-                            "ip_address": "192.168.2.50",
-                            "last_seen": "2024-01-15T10:25:00Z",
-                            "os": "Windows 11",
-                            "memory": "8GB",
-                            "cpu": "Intel i5"
-                        },
-                        {
-                            "uid": "dev-003",
-                            "hostname": "server-bh-01",
-                            "site_uid": "site-003", 
-                            "status": "offline",
-                            "ip_address": "192.168.3.75",
-                            "last_seen": "2024-01-15T09:45:00Z",
-                            "os": "Ubuntu 20.04",
-                            "memory": "32GB",
-                            "cpu": "AMD EPYC"
-                        },
-                        {
-                            "uid": "dev-004",
-                            "hostname": "workstation-sp-02",
-                            "site_uid": "site-001",
-                            "status": "online", 
-                            "ip_address": "192.168.1.101",
-                            "last_seen": "2024-01-15T10:28:00Z",
-                            "os": "Windows 10",
-                            "memory": "16GB",
-                            "cpu": "Intel i7"
-                        },
-                        {
-                            "uid": "dev-005",
-                            "hostname": "server-rj-01",
-                            "site_uid": "site-002",
-                            "status": "online",
-                            "ip_address": "192.168.2.100", 
-                            "last_seen": "2024-01-15T10:32:00Z",
-                            "os": "Windows Server 2022",
-                            "memory": "64GB",
-                            "cpu": "Intel Xeon"
-                        }
-                    ]
-                }
-            
             devices = []
-            for device in devices_data.get("data", []):
-                device_data = {
-                    "uid": device.get("uid"),
-                    "hostname": device.get("hostname"),
-                    "site_uid": device.get("site_uid"),
-                    "status": device.get("status", "unknown"),
-                    "ip_address": device.get("ip_address"),
-                    "last_seen": device.get("last_seen"),
-                    "os": device.get("os"),
-                    "memory": device.get("memory"),
-                    "cpu": device.get("cpu"),
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                devices.append(device_data)
+            async for page in self.iter_devices(since=since):
+                devices.extend(page)
             
             print(f"✅ {len(devices)} dispositivos coletados")
             return devices
-            
+        
         except Exception as e:
             print(f"❌ Erro ao coletar dispositivos: {e}")
+            self.incomplete_collections.add("devices")
             return []
     
-    async def collect_alerts(self) -> List[Dict[str, Any]]:
+    async def collect_alerts(self, since: Optional[str] = None) -> List[Dict[str, Any]]:
         """Coleta alertas do Datto."""
-        print("🔍 Coletando alertas...")
+        print(f"🔍 Coletando alertas{f' alterados desde {since}' if since else ''}...")
         
         try:
-            # Simula dados de alertas (substitua pela API real do Datto)
-            alerts_data = await self._make_request("alerts")
-            
-            if not alerts_data:
-                # Dados mock para desenvolvimento
-                alerts_data = {
-                    "data": [
-                        {
-                            "uid": "alert-001",
-                            "device_uid": "dev-003",
-                            "alert_type": "device_offline",
-                            "severity": "high",
-                            "status": "new",
-                            "message": "Dispositivo server-bh-01 está offline há mais de 30 minutos",
-                            "created_at": "2024-01-15T09:45:00Z"
-                        },
-                        {
-                            "uid": "alert-002",
-                            "device_uid": "dev-001", 
-                            "alert_type": "high_cpu_usage",
-                            "severity": "medium",
-                            "status": "new",
-                            "message": "CPU usage acima de 90% no servidor server-sp-01",
-                            "created_at": "2024-01-15T10:15:00Z"
-                        },
-                        {
-                            "uid": "alert-003",
-                            "device_uid": "dev-004",
-                            "alert_type": "low_disk_space",
-                            "severity": "low", 
-                            "status": "resolved",
-                            "message": "Espaço em disco baixo no workstation-sp-02",
-                            "created_at": "2024-01-15T09:30:00Z"
-                        },
-                        {
-                            "uid": "alert-004",
-                            "device_uid": "dev-002",
-                            "alert_type": "security_update",
-                            "severity": "medium",
-                            "status": "new",
-                            "message": "Atualizações de segurança pendentes no workstation-rj-01",
-                            "created_at": "2024-01-15T10:00:00Z"
-                        }
-                    ]
-                }
-            
             alerts = []
-            for alert in alerts_data.get("data", []):
-                alert_data = {
-                    "uid": alert.get("uid"),
-                    "device_uid": alert.get("device_uid"),
-                    "alert_type": alert.get("alert_type"),
-                    "severity": alert.get("severity", "low"),
-                    "status": alert.get("status", "new"),
-                    "message": alert.get("message"),
-                    "created_at": alert.get("created_at")
-                }
-                alerts.append(alert_data)
+            async for page in self.iter_alerts(since=since):
+                alerts.extend(page)
             
             print(f"✅ {len(alerts)} alertas coletados")
             return alerts
-            
+        
         except Exception as e:
             print(f"❌ Erro ao coletar alertas: {e}")
+            self.incomplete_collections.add("alerts")
             return []
     
     async def collect_device_components(self, device_uid: str) -> List[Dict[str, Any]]:
         """Coleta componentes de um dispositivo específico."""
+        components, _ = await self._fetch_device_components(device_uid)
+        return components or []
+    
+    async def _fetch_device_components(self, device_uid: str,
+                                       skip_unchanged: bool = False) -> Tuple[Optional[List[Dict[str, Any]]], bool]:
+        """Coleta os componentes de um dispositivo, retornando (componentes, não_modificado).
+        
+        Componentes None indicam falha na coleta. Com `skip_unchanged`, uma resposta
+        304 retorna ([], True) sem transformar o corpo em cache.
+        """
         print(f"🔍 Coletando componentes do dispositivo {device_uid}...")
         
         try:
             # Simula dados de componentes (substitua pela API real do Datto)
-            components_data = await self._make_request(f"devices/{device_uid}/components")
+            components_data, not_modified = await self._make_conditional_request(f"devices/{device_uid}/components")
+            
+            if not components_data and not self.use_mock_data:
+                # Sem resposta da API: os componentes já gravados continuam valendo
+                print(f"⚠️  Componentes do dispositivo {device_uid} indisponíveis")
+                return None, False
+            
+            if not_modified and skip_unchanged:
+                # 304: os componentes gravados na última coleta continuam atuais
+                return [], True
             
             if not components_data:
                 # Dados mock para desenvolvimento
@@ -306,139 +715,575 @@ class DataCollector:
                     ]
                 }
             
-            components = []
-            for component in components_data.get("data", []):
-                component_data = {
+            created_at = _now_iso()
+            components = [
+                {
                     "uid": component.get("uid"),
                     "device_uid": device_uid,
                     "name": component.get("name"),
                     "type": component.get("type"),
                     "status": component.get("status", "unknown"),
                     "details": component.get("details"),
-                    "created_at": datetime.now(timezone.utc).isoformat()
+                    "created_at": created_at
                 }
-                components.append(component_data)
+                for component in components_data.get("data", [])
+            ]
             
             print(f"✅ {len(components)} componentes coletados")
-            return components
-            
+            return components, not_modified
+        
         except Exception as e:
             print(f"❌ Erro ao coletar componentes: {e}")
-            return []
+            return None, False
+    
+    def _components_fingerprint(self, components: List[Dict[str, Any]]) -> str:
+        """Impressão digital do conjunto de componentes (independe da ordem e dos campos voláteis)."""
+        hashes = sorted(self._content_hash(component, 'device_components') for component in components)
+        return hashlib.sha1("\n".join(hashes).encode("utf-8")).hexdigest()
+    
+    def _content_hash(self, record: Dict[str, Any], table_name: str) -> str:
+        """Calcula o hash do conteúdo de um registro, ignorando campos voláteis."""
+        volatile = VOLATILE_FIELDS.get(table_name, set()) | {"content_hash"}
+        content = {k: v for k, v in record.items() if k not in volatile}
+        payload = json.dumps(content, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    async def _fetch_existing_hashes(self, table_name: str, uids: Optional[List[str]] = None,
+                                     key: str = 'uid', column: str = 'content_hash') -> Dict[str, Optional[str]]:
+        """Obtém uid -> content_hash de todos os registros da tabela (ou apenas dos uids informados)."""
+        if uids is not None:
+            responses = await asyncio.gather(*(
+                self.supabase.execute(
+                    self.supabase.client.table(table_name)
+                    .select(f'{key},{column}')
+                    .in_(key, uids[i:i + UID_BATCH_SIZE])
+                )
+                for i in range(0, len(uids), UID_BATCH_SIZE)
+            ))
+            return {row[key]: row.get(column) for response in responses for row in (response.data or [])}
+        
+        existing = {}
+        start = 0
+        while True:
+            response = await self.supabase.execute(
+                self.supabase.client.table(table_name)
+                .select(f'{key},{column}')
+                .order(key)
+                .range(start, start + SUPABASE_READ_PAGE_SIZE - 1)
+            )
+            rows = response.data or []
+            for row in rows:
+                existing[row[key]] = row.get(column)
+            if len(rows) < SUPABASE_READ_PAGE_SIZE:
+                return existing
+            start += SUPABASE_READ_PAGE_SIZE
+    
+    async def sync_table(self, pages: AsyncIterator[List[Dict]], table_name: str,
+                         delta: bool = False) -> Optional[Dict[str, int]]:
+        """Sincroniza a tabela por diferença (upsert por uid), gravando apenas o que mudou.
+        
+        Cada página é comparada e entregue ao BulkWriter assim que chega; da coleta ficam em
+        memória só os uids e hashes. Em modo delta as páginas trazem só os registros
+        alterados: nada é removido.
+        """
+        try:
+            stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+            volatile = VOLATILE_FIELDS.get(table_name, set())
+            existing: Optional[Dict[str, Optional[str]]] = None
+            seen = set()
+            
+            async for data in pages:
+                if delta:
+                    existing = await self._fetch_existing_hashes(table_name, [r['uid'] for r in data if r.get('uid')])
+                elif existing is None:
+                    # Lidos com a primeira página: uma coleta vazia não remove nada
+                    existing = await self._fetch_existing_hashes(table_name)
+                
+                to_write = []
+                for record in data:
+                    uid = record.get('uid')
+                    if not uid or uid in seen:
+                        continue
+                    seen.add(uid)
+                    
+                    content_hash = self._content_hash(record, table_name)
+                    if uid not in existing:
+                        stats['inserted'] += 1
+                    elif existing[uid] != content_hash:
+                        stats['updated'] += 1
+                    else:
+                        stats['unchanged'] += 1
+                        continue
+                    # Campos voláteis (ex.: created_at local) ficam fora também das inserções (o banco
+                    # usa o DEFAULT): o PostgREST rejeita lotes cujas linhas têm chaves diferentes
+                    row = {k: v for k, v in record.items() if k not in volatile}
+                    to_write.append({**row, 'content_hash': content_hash})
+                
+                if to_write:
+                    await self.writer.add(table_name, to_write, on_conflict='uid')
+            
+            if not await self.writer.flush(table_name):
+                print(f"❌ Falha ao gravar alterações na tabela {table_name}; remoções canceladas")
+                return None
+            
+            # Só remove registros ausentes quando a coleta da tabela foi completa
+            removed = [] if delta or existing is None else [uid for uid in existing if uid not in seen]
+            if removed and table_name in self.incomplete_collections:
+                print(f"⚠️  Coleta parcial de {table_name}; {len(removed)} remoções adiadas")
+            elif removed:
+                deletes = [(table_name, 'uid')]
+                if table_name == 'devices':
+                    # Componentes de dispositivos removidos não devem sobrar na tabela
+                    deletes += [('device_components', 'device_uid'), (COMPONENT_FINGERPRINTS_TABLE, 'device_uid')]
+                for target, column in deletes:
+                    await asyncio.gather(*(
+                        self.supabase.execute(
+                            self.supabase.client.table(target).delete().in_(column, removed[i:i + UID_BATCH_SIZE])
+                        )
+                        for i in range(0, len(removed), UID_BATCH_SIZE)
+                    ))
+                stats['deleted'] = len(removed)
+            
+            self.last_sync_stats[table_name] = stats
+            print(
+                f"✅ {table_name}: {stats['inserted']} inseridos, {stats['updated']} atualizados, "
+                f"{stats['deleted']} removidos, {stats['unchanged']} inalterados"
+            )
+            return stats
+        
+        except Exception as e:
+            print(f"❌ Erro ao sincronizar a tabela {table_name}: {e}")
+            return None
     
-    async def save_to_supabase(self, data: List[Dict], table_name: str) -> bool:
+    async def save_to_supabase(self, data: List[Dict], table_name: str, mode: Optional[str] = None,
+                               delta: bool = False) -> bool:
         """Salva dados no Supabase."""
+        if not data:
+            print(f"⚠️  Nenhum dado para salvar na tabela {table_name}")
+            return True
+        return await self.save_pages(_single_page(data), table_name, mode, delta)
+    
+    async def save_pages(self, pages: AsyncIterator[List[Dict]], table_name: str, mode: Optional[str] = None,
+                         delta: bool = False) -> bool:
+        """Salva no Supabase as páginas à medida que chegam, sem acumular a coleta."""
         try:
-            if not data:
-                print(f"⚠️  Nenhum dado para salvar na tabela {table_name}")
-                return True
+            mode = mode or self.sync_mode
             
-            # Limpa dados existentes (para sincronização completa)
-            if table_name in ['devices', 'alerts', 'sites']:
-                await self.supabase.client.table(table_name).delete().neq('uid', '').execute()
-                print(f"🗑️  Dados antigos removidos da tabela {table_name}")
+            if table_name in INCREMENTAL_TABLES and (mode == 'upsert' or delta):
+                return await self.sync_table(pages, table_name, delta=delta) is not None
             
-            # Insere novos dados
-            response = await self.supabase.client.table(table_name).insert(data).execute()
+            total = 0
+            async for data in pages:
+                if not data:
+                    continue
+                # Limpa dados existentes (para sincronização completa) só quando chega a primeira página
+                if not total and table_name in INCREMENTAL_TABLES:
+                    await self.supabase.execute(self.supabase.client.table(table_name).delete().neq('uid', ''))
+                    print(f"🗑️  Dados antigos removidos da tabela {table_name}")
+                total += len(data)
+                # Insere em lotes, enviados conforme os limites do BulkWriter são atingidos
+                await self.writer.add(table_name, data)
             
-            if response.data:
-                print(f"✅ {len(response.data)} registros salvos na tabela {table_name}")
+            if not total:
+                print(f"⚠️  Nenhum dado para salvar na tabela {table_name}")
+                return True
+            if await self.writer.flush(table_name):
+                print(f"✅ {total} registros salvos na tabela {table_name}")
                 return True
             else:
                 print(f"❌ Erro ao salvar dados na tabela {table_name}")
                 return False
-                
+        
         except Exception as e:
             print(f"❌ Erro ao salvar dados na tabela {table_name}: {e}")
             return False
+        finally:
+            # Leituras em cache deixam de ser válidas, mesmo que a gravação tenha falhado no meio
+            self.supabase.invalidate_cache(table_name)
+    
+    async def _load_watermarks(self) -> Dict[str, Dict[str, Any]]:
+        """Lê as marcas d'água persistidas (entidade -> estado da última sincronização)."""
+        try:
+            response = await self.supabase.execute(self.supabase.client.table(SYNC_STATE_TABLE).select('*'))
+            return {row['entity']: row for row in (response.data or [])}
+        except Exception as e:
+            print(f"⚠️  Marcas d'água indisponíveis ({e}); usando sincronização completa")
+            return {}
+    
+    def _plan_sync(self, table_name: str, started_at: datetime) -> Optional[str]:
+        """Decide o modo da entidade: retorna o `since` da coleta delta ou None para coleta completa."""
+        if not self.delta_enabled or self.force_full or self.sync_mode != 'upsert' or table_name not in DELTA_TABLES:
+            return None
+        
+        state = self.watermarks.get(table_name) or {}
+        last_synced = _parse_timestamp(state.get('last_synced_at'))
+        last_full = _parse_timestamp(state.get('last_full_sync_at'))
+        if last_synced is None or last_full is None:
+            return None
+        if started_at - last_full >= self.full_reconcile_interval:
+            print(f"🔁 {table_name}: reconciliação completa (última em {state['last_full_sync_at']})")
+            return None
+        
+        # Sobreposição cobre diferenças de relógio e registros gravados durante a última coleta
+        return (last_synced - self.watermark_overlap).isoformat()
+    
+    async def _save_watermark(self, table_name: str, mode: str, started_at: datetime, transferred: int) -> None:
+        """Persiste a marca d'água da entidade após uma sincronização bem-sucedida."""
+        row = {
+            'entity': table_name,
+            'last_synced_at': started_at.isoformat(),
+            'last_mode': mode,
+            f'last_{mode}_records': transferred,
+            'updated_at': _now_iso()
+        }
+        if mode == 'full':
+            row['last_full_sync_at'] = started_at.isoformat()
+        try:
+            await self.supabase.execute(
+                self.supabase.client.table(SYNC_STATE_TABLE).upsert(row, on_conflict='entity')
+            )
+            self.watermarks[table_name] = {**self.watermarks.get(table_name, {}), **row}
+        except Exception as e:
+            print(f"⚠️  Não foi possível gravar a marca d'água de {table_name}: {e}")
+    
+    async def _sync_entity(self, table_name: str,
+                           iterate: Callable[..., AsyncIterator[List[Dict[str, Any]]]]) -> List[str]:
+        """Coleta e grava uma entidade em modo delta (desde a marca d'água) ou completo.
+        
+        As páginas seguem direto da API para a gravação; retorna apenas os uids coletados.
+        """
+        started_at = datetime.now(timezone.utc)
+        since = self._plan_sync(table_name, started_at)
+        mode = 'delta' if since else 'full'
+        print(f"🔍 Coletando {table_name}{f' alterados desde {since}' if since else ''}...")
+        
+        uids: List[str] = []
+        # Frota em memória: registros compactos, aplicados só depois de gravados
+        records: List[Any] = []
+        
+        async def pages() -> AsyncIterator[List[Dict[str, Any]]]:
+            source = iterate(since=since) if table_name in DELTA_TABLES else iterate()
+            async for page in source:
+                uids.extend(record['uid'] for record in page if record.get('uid'))
+                if table_name in self.fallback_collections:
+                    # A última coleta válida (até um dia de idade) só serve às leituras: gravá-la
+                    # sobrescreveria registros mais novos das coletas delta e reabriria alertas resolvidos
+                    continue
+                if self.fleet.enabled:
+                    records.extend(self.fleet.compact(table_name, page))
+                yield page
+        
+        saved = await self.save_pages(pages(), table_name, delta=bool(since))
+        fallback = table_name in self.fallback_collections
+        if fallback:
+            print(f"♻️  {table_name}: última coleta válida não gravada no Supabase nem na frota em memória")
+            saved = False
+        
+        stats = self.last_sync_stats.setdefault(table_name, {})
+        stats.update(mode=mode, transferred=len(uids))
+        if fallback:
+            stats['fallback_saved_at'] = self.fallback_collections[table_name]
+        print(f"📦 {table_name}: {len(uids)} registros transferidos (modo {mode})")
+        if not fallback:
+            self._update_fleet(table_name, records, mode, saved)
+        
+        # A marca d'água só avança quando a coleta foi completa e gravada
+        if table_name in DELTA_TABLES and saved and table_name not in self.incomplete_collections:
+            await self._save_watermark(table_name, mode, started_at, len(uids))
+        return uids
+    
+    async def _component_device_uids(self, collected: List[str]) -> List[str]:
+        """Dispositivos cujos componentes serão coletados: os coletados e, em modo delta, os já gravados."""
+        if self.last_sync_stats.get('devices', {}).get('mode') != 'delta':
+            return collected
+        if self.fleet.is_complete('devices'):
+            known = self.fleet.uids('devices')
+        else:
+            try:
+                known = list(await self._fetch_existing_hashes('devices'))
+            except Exception as e:
+                print(f"⚠️  Dispositivos gravados indisponíveis ({e}); componentes só dos {len(collected)} coletados")
+                return collected
+        # Repetidos são descartados em collect_all_components
+        return collected + known
+    
+    def _update_fleet(self, table_name: str, records: List[Any], mode: str, saved: bool) -> None:
+        """Replica na frota em memória o que foi gravado no Supabase."""
+        if not saved:
+            # Gravação parcial: o estado do banco é incerto, as leituras voltam a consultá-lo
+            self.fleet.invalidate(table_name)
+        elif mode == 'full' and table_name not in self.incomplete_collections:
+            self.fleet.replace(table_name, records)
+        elif records:
+            # Delta ou coleta parcial: nada foi removido do banco, só inserido/atualizado
+            self.fleet.upsert(table_name, records)
+    
+    async def _collect_components_for_device(self, device_uid: str, semaphore: asyncio.Semaphore,
+                                             fingerprints: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """Coleta e salva os componentes de um dispositivo, isolando falhas.
+        
+        Com `fingerprints`, só grava quando o conjunto de componentes mudou, substituindo
+        os componentes antigos do dispositivo em uma única transação.
+        """
+        async with semaphore:
+            started = time.perf_counter()
+            result = {'device_uid': device_uid, 'components': 0, 'success': True, 'error': None,
+                      'not_modified': False, 'replaced': False}
+            try:
+                # Um 304 só dispensa a gravação se os componentes atuais já estão no banco
+                known = fingerprints is None or fingerprints.get(device_uid) is not None
+                components, not_modified = await self._fetch_device_components(device_uid, skip_unchanged=known)
+                result['not_modified'] = not_modified
+                if components is None:
+                    result['success'] = False
+                    result['error'] = 'componentes indisponíveis'
+                elif fingerprints is None:
+                    result['components'] = len(components)
+                    if components:
+                        # Sem a migração 006: inserção simples, acumulada em lotes
+                        await self.writer.add('device_components', components)
+                elif not not_modified:
+                    result['components'] = len(components)
+                    fingerprint = self._components_fingerprint(components)
+                    if fingerprint != fingerprints.get(device_uid):
+                        await self.writer.add_rpc(REPLACE_COMPONENTS_RPC, [{
+                            'device_uid': device_uid,
+                            'fingerprint': fingerprint,
+                            'components': components
+                        }])
+                        result['replaced'] = True
+                    # Substituídos ou iguais aos gravados: é o conjunto atual no banco
+                    self.fleet.set_components(device_uid, components)
+            except Exception as e:
+                print(f"❌ Erro ao processar componentes do dispositivo {device_uid}: {e}")
+                result['success'] = False
+                result['error'] = str(e)
+            result['elapsed'] = time.perf_counter() - started
+            self._components_done += 1
+            self._report_progress('components', done=self._components_done, total=self._components_total)
+            return result
+    
+    async def _load_component_fingerprints(self, uids: List[str]) -> Optional[Dict[str, Optional[str]]]:
+        """Impressões digitais gravadas dos dispositivos; None se a tabela não existir (migração 006)."""
+        try:
+            if len(uids) > SUPABASE_READ_PAGE_SIZE:
+                return await self._fetch_existing_hashes(COMPONENT_FINGERPRINTS_TABLE, key='device_uid', column='fingerprint')
+            return await self._fetch_existing_hashes(COMPONENT_FINGERPRINTS_TABLE, uids, key='device_uid', column='fingerprint')
+        except Exception as e:
+            print(f"⚠️  Impressões digitais dos componentes indisponíveis ({e}); aplique migrations/006_component_fingerprints.sql")
+            return None
+    
+    def _components_cache_key(self, device_uid: str) -> str:
+        return self.response_cache.make_key(f"{self.base_url}/devices/{device_uid}/components")
+    
+    async def collect_all_components(self, device_uids: List[str]) -> List[Dict[str, Any]]:
+        """Coleta componentes dos dispositivos informados (uids) com concorrência limitada."""
+        if not device_uids:
+            return []
+        
+        if self.circuit.is_open:
+            # Os componentes já gravados continuam valendo até a API voltar
+            print(f"🔌 API Datto indisponível; componentes de {len(device_uids)} dispositivos adiados")
+            return []
+        
+        # Um dispositivo repetido na lista geraria duas substituições no mesmo lote
+        device_uids = list(dict.fromkeys(device_uids))
+        print(f"🔍 Coletando componentes de {len(device_uids)} dispositivos (concorrência: {self.component_concurrency})...")
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.component_concurrency)
+        self._components_done = 0
+        self._components_total = len(device_uids)
+        fingerprints = await self._load_component_fingerprints(device_uids)
+        results = await asyncio.gather(*(
+            self._collect_components_for_device(device_uid, semaphore, fingerprints)
+            for device_uid in device_uids
+        ))
+        target = 'device_components' if fingerprints is None else REPLACE_COMPONENTS_RPC
+        if not await self.writer.flush(target):
+            print("❌ Falha ao gravar parte dos componentes; veja os erros de lote acima")
+            # Sem saber quais lotes falharam, descarta o cache HTTP dos dispositivos gravados:
+            # um 304 na próxima coleta não pode esconder componentes que não chegaram ao banco
+            await asyncio.gather(*(
+                asyncio.to_thread(self.response_cache.delete, self._components_cache_key(r['device_uid']))
+                for r in results if r['components'] or r['replaced']
+            ))
+            self.fleet.drop_components(r['device_uid'] for r in results if r['replaced'])
+        self.supabase.invalidate_cache('device_components')
+        
+        failed = [r for r in results if not r['success']]
+        not_modified = sum(1 for r in results if r['not_modified'])
+        replaced = sum(1 for r in results if r['replaced'])
+        slowest = max(results, key=lambda r: r['elapsed'])
+        average = sum(r['elapsed'] for r in results) / len(results)
+        print(
+            f"✅ Componentes de {len(results) - len(failed)}/{len(results)} dispositivos processados "
+            f"em {time.perf_counter() - started:.2f}s "
+            f"(média {average:.2f}s, mais lento {slowest['device_uid']} {slowest['elapsed']:.2f}s)"
+        )
+        if not_modified:
+            print(f"💾 {not_modified} dispositivos sem alteração nos componentes (304); nada gravado para eles")
+        if fingerprints is not None:
+            print(f"🧩 Componentes substituídos em {replaced} dispositivos; "
+                  f"{len(results) - replaced - len(failed)} sem alteração")
+        if failed:
+            print(f"⚠️  Falha em {len(failed)} dispositivos: {', '.join(r['device_uid'] for r in failed[:10])}")
+        return results
+    
+    def _table_changed(self, table_name: str) -> bool:
+        """Se a sincronização gravou alguma alteração na tabela (na dúvida, considera que sim)."""
+        stats = self.last_sync_stats.get(table_name) or {}
+        if stats.get('transferred') == 0 or 'fallback_saved_at' in stats:
+            return False
+        if 'inserted' in stats:
+            return stats['inserted'] + stats['updated'] + stats['deleted'] > 0
+        return True
+    
+    async def _refresh_site_rollups(self) -> None:
+        """Recalcula os agregados por site quando sites, dispositivos ou alertas mudaram."""
+        if not any(self._table_changed(table_name) for table_name in INCREMENTAL_TABLES):
+            print("📊 Agregados por site inalterados: nada gravado em sites, dispositivos ou alertas")
+            return
+        
+        started = time.perf_counter()
+        changed = await self.supabase.refresh_site_rollups()
+        if changed is not None:
+            self.last_sync_stats['site_rollups'] = {'changed': changed}
+            print(f"📊 Agregados por site atualizados: {changed} sites alterados em {time.perf_counter() - started:.2f}s")
     
     async def collect_all_data(self) -> bool:
         """Coleta todos os dados do Datto e salva no Supabase."""
         print("🚀 Iniciando coleta completa de dados do Datto...")
         
         try:
+            if self.delta_enabled and self.sync_mode == 'upsert':
+                self.watermarks = await self._load_watermarks()
+            
             # Coleta sites
-            sites = await self.collect_sites()
-            if sites:
-                await self.save_to_supabase(sites, 'sites')
+            self._report_progress('sites')
+            site_uids = await self._sync_entity('sites', self.iter_sites)
             
-            # Coleta dispositivos
-            devices = await self.collect_devices()
-            if devices:
-                await self.save_to_supabase(devices, 'devices')
+            # Coleta dispositivos (delta desde a última sincronização, quando possível)
+            self._report_progress('devices', sites=len(site_uids))
+            device_uids = await self._sync_entity('devices', self.iter_devices)
             
             # Coleta alertas
-            alerts = await self.collect_alerts()
-            if alerts:
-                await self.save_to_supabase(alerts, 'alerts')
+            self._report_progress('alerts', devices=len(device_uids))
+            alert_uids = await self._sync_entity('alerts', self.iter_alerts)
             
-            # Coleta componentes para cada dispositivo
-            for device in devices:
-                components = await self.collect_device_components(device['uid'])
-                if components:
-                    await self.save_to_supabase(components, 'device_components')
+            # Agregados por site para a página /sites (migrations/007_site_rollups.sql)
+            self._report_progress('rollups', alerts=len(alert_uids))
+            await self._refresh_site_rollups()
+            
+            # Coleta componentes dos dispositivos em paralelo (limitado); em modo delta também
+            # dos que não mudaram, pois um componente pode mudar sem alterar o dispositivo
+            device_uids = await self._component_device_uids(device_uids)
+            self._report_progress('components', done=0, total=len(device_uids))
+            await self.collect_all_components(device_uids)
+            self._report_progress('done')
             
             print("✅ Coleta de dados concluída com sucesso!")
             return True
-            
+        
         except Exception as e:
             print(f"❌ Erro durante a coleta de dados: {e}")
             return False
     
-    async def collect_realtime_data(self) -> Dict[str, Any]:
-        """Coleta dados em tempo real para o dashboard."""
+    async def collect_realtime_data(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Coleta dados em tempo real para o dashboard.
+        
+        Entidades atualizadas na frota em memória há até `max_age` segundos
+        (REALTIME_SNAPSHOT_MAX_AGE; 0 desativa) são contadas pelos índices; as demais
+        são coletadas da API em paralelo.
+        """
         print("🔄 Coletando dados em tempo real...")
+        if max_age is None:
+            max_age = self.realtime_max_age
+        
+        stats: Dict[str, int] = {}
+        stale = []
+        for table_name in REALTIME_COUNTERS:
+            if max_age > 0 and self.fleet.is_complete(table_name, max_age):
+                stats.update(self._fleet_counters(table_name))
+            else:
+                stale.append(table_name)
+        
+        for counters in await asyncio.gather(*(self._count_entity(table_name) for table_name in stale)):
+            stats.update(counters)
         
+        # Mesma ordem de chaves independentemente da origem de cada contador
+        stats = {key: stats[key] for table_name in REALTIME_COUNTERS for key in _count_records(table_name, [])}
+        reused = len(REALTIME_COUNTERS) - len(stale)
+        print(f"✅ Estatísticas atualizadas{f' ({reused} entidade(s) da última coleta)' if reused else ''}: {stats}")
+        return stats
+    
+    async def _count_entity(self, table_name: str) -> Dict[str, int]:
+        """Conta os registros de uma entidade página a página, sem guardar a lista."""
+        iterate = {'sites': self.iter_sites, 'devices': self.iter_devices, 'alerts': self.iter_alerts}[table_name]
+        counters = _count_records(table_name, [])
         try:
-            # Coleta estatísticas básicas
-            devices = await self.collect_devices()
-            alerts = await self.collect_alerts()
-            
-            stats = {
-                'total_devices': len(devices),
-                'online_devices': len([d for d in devices if d.get('status') == 'online']),
-                'offline_devices': len([d for d in devices if d.get('status') == 'offline']),
-                'total_alerts': len(alerts),
-                'new_alerts': len([a for a in alerts if a.get('status') == 'new']),
-                'total_sites': len(await self.collect_sites())
-            }
-            
-            print(f"✅ Estatísticas atualizadas: {stats}")
-            return stats
-            
+            async for page in iterate():
+                _count_records(table_name, page, counters)
         except Exception as e:
-            print(f"❌ Erro ao coletar dados em tempo real: {e}")
-            return {
-                'total_devices': 0,
-                'online_devices': 0,
-                'offline_devices': 0,
-                'total_alerts': 0,
-                'new_alerts': 0,
-                'total_sites': 0
-            }
+            print(f"❌ Erro ao coletar {table_name} em tempo real: {e}")
+            self.incomplete_collections.add(table_name)
+            return _count_records(table_name, [])
+        
+        return counters
+    
+    def _fleet_counters(self, table_name: str) -> Dict[str, int]:
+        """Contadores do dashboard a partir dos índices da frota em memória."""
+        total_key, status_keys = REALTIME_COUNTERS[table_name]
+        by_status = self.fleet.count_by(table_name, 'status')
+        counters = {total_key: self.fleet.count(table_name)}
+        for status, key in status_keys.items():
+            counters[key] = by_status.get(status, 0)
+        return counters
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+async def _single_page(data: List[Dict[str, Any]]) -> AsyncIterator[List[Dict[str, Any]]]:
+    yield data
+
+def _endpoint_label(url: str, base_url: str) -> str:
+    """Endpoint da URL para as métricas, sem a base nem identificadores (ex.: devices/{uid}/components)."""
+    path = urlsplit(url).path
+    base_path = urlsplit(base_url).path
+    if path.startswith(base_path):
+        path = path[len(base_path):]
+    # Uids (do Datto e dos dados de teste) sempre têm dígitos; os nomes dos recursos não
+    return '/'.join('{uid}' if any(c.isdigit() for c in part) else part for part in path.strip('/').split('/'))
 
 # Função para teste local
 async def test_collector():
     """Função para testar o coletor localmente."""
-    collector = DataCollector()
-    
-    print("🧪 Testando coletor de dados...")
-    
-    # Testa coleta de sites
-    sites = await collector.collect_sites()
-    print(f"Sites coletados: {len(sites)}")
-    
-    # Testa coleta de dispositivos
-    devices = await collector.collect_devices()
-    print(f"Dispositivos coletados: {len(devices)}")
-    
-    # Testa coleta de alertas
-    alerts = await collector.collect_alerts()
-    print(f"Alertas coletados: {len(alerts)}")
-    
-    # Testa dados em tempo real
-    stats = await collector.collect_realtime_data()
-    print(f"Estatísticas: {stats}")
+    async with DataCollector() as collector:
+        print("🧪 Testando coletor de dados...")
+        
+        # Testa coleta de sites
+        sites = await collector.collect_sites()
+        print(f"Sites coletados: {len(sites)}")
+        
+        # Testa coleta de dispositivos
+        devices = await collector.collect_devices()
+        print(f"Dispositivos coletados: {len(devices)}")
+        
+        # Testa coleta de alertas
+        alerts = await collector.collect_alerts()
+        print(f"Alertas coletados: {len(alerts)}")
+        
+        # Testa dados em tempo real
+        stats = await collector.collect_realtime_data()
+        print(f"Estatísticas: {stats}")
 
 if __name__ == "__main__":
     asyncio.run(test_collector()) 
\ No newline at end of file
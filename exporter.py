@@ -0,0 +1,55 @@
+import io
+import csv
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List
+
+# Formatos de exportação: extensão -> content type
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+def encode_pages(pages: Iterable[List[Dict[str, Any]]], fmt: str) -> Iterator[bytes]:
+    """Converte lotes de registros em blocos de bytes no formato pedido, um bloco por lote."""
+    if fmt == 'ndjson':
+        for page in pages:
+            yield ''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in page).encode('utf-8')
+    
+    elif fmt == 'json':
+        # Array JSON montado de forma incremental
+        first = True
+        yield b'['
+        for page in pages:
+            chunk = ','.join(json.dumps(row, default=str, ensure_ascii=False) for row in page)
+            if chunk:
+                yield (chunk if first else ',' + chunk).encode('utf-8')
+                first = False
+        yield b']'
+    
+    elif fmt == 'csv':
+        # As colunas são as do primeiro registro; campos extras em registros seguintes são ignorados
+        writer = None
+        buffer = io.StringIO()
+        for page in pages:
+            for row in page:
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=list(row.keys()), extrasaction='ignore')
+                    writer.writeheader()
+                writer.writerow({k: json.dumps(v, default=str) if isinstance(v, (dict, list)) else v for k, v in row.items()})
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    
+    else:
+        raise ValueError(f"Formato de exportação não suportado: {fmt}")
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime um fluxo de blocos em gzip sem acumular o conteúdo inteiro."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,231 @@
+import os
+import sys
+import time
+import threading
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+
+class _Record:
+    """Registro compacto: atributos em __slots__ (sem dicionário por instância).
+    
+    Tratado como imutável: alterações criam um novo registro (veja FleetSnapshot.patch),
+    para que leitores em outras threads nunca vejam um registro pela metade.
+    """
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    # Campos com poucos valores distintos (status, site, SO...): uma única cópia de cada string
+    INTERNED: frozenset = frozenset()
+    
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "_Record":
+        record = cls.__new__(cls)
+        for name in cls.FIELDS:
+            value = row.get(name)
+            if name in cls.INTERNED and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(record, name, value)
+        return record
+    
+    def to_row(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+    
+    def replace(self, **changes) -> "_Record":
+        return self.from_row({**self.to_row(), **changes})
+    
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} é imutável")
+    
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_row()!r})"
+
+class SiteRecord(_Record):
+    __slots__ = FIELDS = ('uid', 'name', 'address', 'status', 'device_count')
+    INTERNED = frozenset({'status'})
+
+class DeviceRecord(_Record):
+    __slots__ = FIELDS = ('uid', 'hostname', 'site_uid', 'status', 'ip_address', 'last_seen', 'os', 'memory', 'cpu')
+    INTERNED = frozenset({'site_uid', 'status', 'os', 'memory', 'cpu'})
+
+class AlertRecord(_Record):
+    __slots__ = FIELDS = ('uid', 'device_uid', 'alert_type', 'severity', 'status', 'message', 'created_at')
+    INTERNED = frozenset({'device_uid', 'alert_type', 'severity', 'status'})
+
+class ComponentRecord(_Record):
+    __slots__ = FIELDS = ('uid', 'device_uid', 'name', 'type', 'status', 'details')
+    INTERNED = frozenset({'device_uid', 'name', 'type', 'status'})
+
+# Tipo de registro e campos indexados de cada tabela
+RECORD_TYPES = {'sites': SiteRecord, 'devices': DeviceRecord, 'alerts': AlertRecord}
+INDEXED_FIELDS = {'sites': ('status',), 'devices': ('site_uid', 'status'), 'alerts': ('device_uid', 'status')}
+
+class _Table:
+    """Registros de uma tabela por uid, com índices secundários (valor -> uids)."""
+    
+    def __init__(self, table_name: str, rows: Iterable[Dict[str, Any]] = ()):
+        self.record_type = RECORD_TYPES[table_name]
+        self.records: Dict[str, _Record] = {}
+        self.indexes: Dict[str, Dict[Any, set]] = {field: {} for field in INDEXED_FIELDS[table_name]}
+        for row in rows:
+            self.put(_as_record(self.record_type, row))
+    
+    def put(self, record: _Record) -> None:
+        self.discard(record.uid)
+        self.records[record.uid] = record
+        for field, index in self.indexes.items():
+            index.setdefault(getattr(record, field), set()).add(record.uid)
+    
+    def discard(self, uid: str) -> Optional[_Record]:
+        record = self.records.pop(uid, None)
+        if record is not None:
+            for field, index in self.indexes.items():
+                uids = index.get(getattr(record, field))
+                if uids is not None:
+                    uids.discard(uid)
+                    if not uids:
+                        del index[getattr(record, field)]
+        return record
+
+def _as_record(record_type: type, row: Any) -> _Record:
+    return row if isinstance(row, _Record) else record_type.from_row(row)
+
+class FleetSnapshot:
+    """Cópia em memória da frota gravada no Supabase, compartilhada pelo coletor e pelas rotas.
+    
+    Mantida pela sincronização (substituição nas coletas completas, upsert nas coletas
+    delta). Uma tabela só é considerada completa depois de uma coleta completa bem-sucedida
+    neste processo; até lá, as leituras devem ir ao banco.
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("FLEET_SNAPSHOT_ENABLED", "true").lower() == "true"
+        self._tables: Dict[str, _Table] = {name: _Table(name) for name in RECORD_TYPES}
+        self._components: Dict[str, Tuple[ComponentRecord, ...]] = {}
+        # Tabela -> momento (monotonic) da última atualização, apenas para tabelas completas
+        self._complete: Dict[str, float] = {}
+        self._lock = threading.RLock()
+    
+    # Escrita (sincronização)
+    
+    def compact(self, table_name: str, rows: Iterable[Dict[str, Any]]) -> List[_Record]:
+        """Registros compactos das linhas, para guardar uma coleta até que ela seja gravada."""
+        record_type = RECORD_TYPES[table_name]
+        return [record_type.from_row(row) for row in rows]
+    
+    def replace(self, table_name: str, rows: Iterable[Any]) -> None:
+        """Substitui a tabela pelo resultado de uma coleta completa (linhas ou registros compactos)."""
+        if not self.enabled:
+            return
+        table = _Table(table_name, rows)
+        with self._lock:
+            self._tables[table_name] = table
+            self._complete[table_name] = time.monotonic()
+            if table_name == 'devices':
+                for uid in [uid for uid in self._components if uid not in table.records]:
+                    del self._components[uid]
+    
+    def upsert(self, table_name: str, rows: Iterable[Any]) -> None:
+        """Aplica registros novos ou alterados (coleta delta)."""
+        if not self.enabled:
+            return
+        record_type = RECORD_TYPES[table_name]
+        records = [_as_record(record_type, row) for row in rows]
+        with self._lock:
+            table = self._tables[table_name]
+            for record in records:
+                table.put(record)
+            if table_name in self._complete:
+                self._complete[table_name] = time.monotonic()
+    
+    def patch(self, table_name: str, uid: str, **changes) -> bool:
+        """Altera campos de um registro (ex.: alerta resolvido pela aplicação)."""
+        with self._lock:
+            table = self._tables[table_name]
+            record = table.records.get(uid)
+            if record is None:
+                return False
+            table.put(record.replace(**changes))
+            return True
+    
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        """Marca a tabela (ou todas) como desatualizada: o banco passa a ser a fonte das leituras."""
+        with self._lock:
+            if table_name is None:
+                self._complete.clear()
+                self._components.clear()
+            else:
+                self._complete.pop(table_name, None)
+    
+    def set_components(self, device_uid: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Componentes atuais de um dispositivo (os mesmos gravados no banco)."""
+        if not self.enabled:
+            return
+        components = tuple(ComponentRecord.from_row(row) for row in rows)
+        with self._lock:
+            self._components[device_uid] = components
+    
+    def drop_components(self, device_uids: Iterable[str]) -> None:
+        with self._lock:
+            for uid in device_uids:
+                self._components.pop(uid, None)
+    
+    # Leitura
+    
+    def is_complete(self, table_name: str, max_age: Optional[float] = None) -> bool:
+        """Se a tabela reflete o banco (e foi atualizada há no máximo `max_age` segundos)."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            updated = self._complete.get(table_name)
+        if updated is None:
+            return False
+        return max_age is None or time.monotonic() - updated <= max_age
+    
+    def get(self, table_name: str, uid: str) -> Optional[_Record]:
+        with self._lock:
+            return self._tables[table_name].records.get(uid)
+    
+    def uids(self, table_name: str) -> List[str]:
+        with self._lock:
+            return list(self._tables[table_name].records)
+    
+    def find(self, table_name: str, field: str, value: Any) -> List[_Record]:
+        """Registros com `field == value`, pelo índice secundário."""
+        with self._lock:
+            table = self._tables[table_name]
+            return [table.records[uid] for uid in table.indexes[field].get(value, ())]
+    
+    def count(self, table_name: str, field: Optional[str] = None, value: Any = None) -> int:
+        with self._lock:
+            table = self._tables[table_name]
+            if field is None:
+                return len(table.records)
+            return len(table.indexes[field].get(value, ()))
+    
+    def count_by(self, table_name: str, field: str) -> Dict[Any, int]:
+        """Quantidade de registros por valor do campo indexado."""
+        with self._lock:
+            return {value: len(uids) for value, uids in self._tables[table_name].indexes[field].items()}
+    
+    def components(self, device_uid: str) -> Optional[Tuple[ComponentRecord, ...]]:
+        """Componentes do dispositivo, ou None se não estiverem na memória."""
+        with self._lock:
+            return self._components.get(device_uid)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'enabled': self.enabled,
+                'tables': {
+                    name: {
+                        'records': len(table.records),
+                        'complete': name in self._complete,
+                        'age_seconds': round(now - self._complete[name], 1) if name in self._complete else None
+                    }
+                    for name, table in self._tables.items()
+                },
+                'devices_with_components': len(self._components),
+                'components': sum(len(c) for c in self._components.values())
+            }
+
+# Compartilhada pelo processo: o coletor mantém, as rotas (via SupabaseManager) consultam
+fleet_snapshot = FleetSnapshot()
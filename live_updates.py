@@ -0,0 +1,110 @@
+import os
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+class LiveUpdates:
+    """Distribui eventos do dashboard (Server-Sent Events) para todas as conexões abertas.
+    
+    Cada evento é serializado uma única vez e copiado para a fila de cada assinante;
+    o último evento de cada tipo fica guardado para quem reconectar depois dele.
+    """
+    
+    def __init__(self, max_subscribers: Optional[int] = None, queue_size: Optional[int] = None,
+                 heartbeat: Optional[float] = None):
+        self.max_subscribers = max_subscribers or int(os.getenv("LIVE_MAX_SUBSCRIBERS", "50"))
+        self.queue_size = queue_size or int(os.getenv("LIVE_QUEUE_SIZE", "16"))
+        self.heartbeat = heartbeat or float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+        
+        self._subscribers: set = set()
+        self._last: Dict[str, Tuple[int, str]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+    
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+    
+    def publish(self, event: str, data: Dict[str, Any]) -> int:
+        """Envia o evento a todos os assinantes. Retorna o id do evento."""
+        data = {**data, 'published_at': datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            self._next_id += 1
+            event_id = self._next_id
+            message = _format(event_id, event, data)
+            self._last[event] = (event_id, message)
+            self.published += 1
+            subscribers = list(self._subscribers)
+        
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # Conexão lenta: descarta o evento mais antigo em vez de bloquear quem publica
+                try:
+                    q.get_nowait()
+                    q.put_nowait(message)
+                except (queue.Empty, queue.Full):
+                    pass
+                self.dropped += 1
+        return event_id
+    
+    def subscribe(self) -> Optional["queue.Queue[str]"]:
+        """Registra uma conexão. Retorna None se o limite de conexões foi atingido."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            q: "queue.Queue[str]" = queue.Queue(maxsize=self.queue_size)
+            self._subscribers.add(q)
+            return q
+    
+    def unsubscribe(self, q: "queue.Queue[str]") -> None:
+        with self._lock:
+            self._subscribers.discard(q)
+    
+    def missed_since(self, last_event_id: Optional[str]) -> list:
+        """Últimos eventos de cada tipo posteriores ao id informado (reconexão do navegador)."""
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_id = None
+        if last_id is None:
+            return []
+        with self._lock:
+            return [message for event_id, message in sorted(self._last.values()) if event_id > last_id]
+    
+    def stream(self, q: "queue.Queue[str]", last_event_id: Optional[str] = None) -> Iterator[str]:
+        """Corpo da resposta text/event-stream de uma conexão; encerra a assinatura ao desconectar."""
+        try:
+            # Intervalo de reconexão do EventSource do navegador
+            yield "retry: 5000\n\n"
+            for message in self.missed_since(last_event_id):
+                yield message
+            while True:
+                try:
+                    yield q.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Comentário SSE: mantém a conexão aberta em proxies e detecta clientes desconectados
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(q)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'subscribers': self.subscribers,
+            'max_subscribers': self.max_subscribers,
+            'published': self.published,
+            'dropped': self.dropped
+        }
+
+def _format(event_id: int, event: str, data: Dict[str, Any]) -> str:
+    payload = json.dumps(data, default=str, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+# Compartilhado pelo processo: a sincronização e as rotas publicam, as conexões SSE consomem
+live_updates = LiveUpdates()
@@ -0,0 +1,171 @@
+import os
+import time
+import bisect
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterator, Sequence, Tuple
+
+# Limites (s) dos histogramas de latência: de 5ms (cache, consultas simples) a 1min (fases da sincronização)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class _Metric(ABC):
+    """Métrica com rótulos; cada combinação de valores dos rótulos é uma série."""
+    TYPE = ''
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), enabled: bool = True):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._series: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def _labels(self, key: Tuple[str, ...], **extra: str) -> str:
+        items = list(zip(self.labelnames, key)) + list(extra.items())
+        pairs = [f'{name}="{_escape(value)}"' for name, value in items]
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+    
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Linhas de amostra de todas as séries, no formato texto do Prometheus."""
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"] + self.samples()
+
+class Counter(_Metric):
+    TYPE = 'counter'
+    
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted(self._series.items())
+        return [f"{self.name}{self._labels(key)} {_number(value)}" for key, value in series]
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, enabled: bool = True):
+        super().__init__(name, documentation, labelnames, enabled)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = self._key(labels)
+        # Contagem por faixa (não cumulativa); a soma acumulada só é feita na exportação
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+    
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Mede a duração do bloco, inclusive quando ele levanta uma exceção."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f"{self.name}_bucket{self._labels(key, le=le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Métricas do processo, exportadas em /metrics no formato texto do Prometheus."""
+    
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+    
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self._metrics: Dict[str, _Metric] = {}
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, enabled=self.enabled))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets, enabled=self.enabled))
+    
+    def _register(self, metric: _Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica duplicada: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+# Compartilhado pelo processo: coletor, SupabaseManager e rotas registram; /metrics exporta
+registry = MetricsRegistry()
+
+datto_requests = registry.counter(
+    'datto_requests_total', 'Requisições à API Datto por endpoint e status HTTP (error = falha de rede)',
+    ('endpoint', 'status'))
+datto_request_duration = registry.histogram(
+    'datto_request_duration_seconds', 'Duração de cada tentativa de requisição à API Datto', ('endpoint',))
+datto_response_bytes = registry.counter(
+    'datto_response_bytes_total', 'Bytes recebidos da API Datto', ('endpoint',))
+
+supabase_queries = registry.counter(
+    'supabase_queries_total', 'Consultas ao Supabase por tabela (ou rpc/função), método HTTP e resultado',
+    ('table', 'method', 'outcome'))
+supabase_query_duration = registry.histogram(
+    'supabase_query_duration_seconds', 'Duração das consultas ao Supabase, incluindo a espera no pool de threads',
+    ('table', 'method'))
+
+http_requests = registry.counter(
+    'http_requests_total', 'Requisições às rotas Flask por rota, método e status', ('route', 'method', 'status'))
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Duração das rotas Flask até a resposta (sem o corpo em streaming)',
+    ('route', 'method'))
+http_response_bytes = registry.counter(
+    'http_response_bytes_total', 'Bytes enviados pelas rotas Flask (respostas com tamanho conhecido)', ('route',))
+
+sync_phase_duration = registry.histogram(
+    'sync_phase_duration_seconds', 'Duração de cada fase da sincronização com o Datto', ('phase',),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0))
+sync_jobs = registry.counter(
+    'sync_jobs_total', 'Jobs de sincronização finalizados por status', ('status',))
@@ -0,0 +1,11 @@
+-- Sincronização incremental (DataCollector.sync_table)
+-- Cada registro guarda o hash do seu conteúdo para que a coleta grave apenas
+-- o que mudou; o upsert por uid exige uma restrição única nessa coluna.
+
+ALTER TABLE sites ADD COLUMN IF NOT EXISTS content_hash text;
+ALTER TABLE devices ADD COLUMN IF NOT EXISTS content_hash text;
+ALTER TABLE alerts ADD COLUMN IF NOT EXISTS content_hash text;
+
+CREATE UNIQUE INDEX IF NOT EXISTS sites_uid_key ON sites (uid);
+CREATE UNIQUE INDEX IF NOT EXISTS devices_uid_key ON devices (uid);
+CREATE UNIQUE INDEX IF NOT EXISTS alerts_uid_key ON alerts (uid);
@@ -0,0 +1,58 @@
+-- Estatísticas do dashboard em uma única chamada (SupabaseManager.get_dashboard_stats)
+-- Retorna totais e contagens por status de devices/alerts e o total de sites.
+-- Com use_estimate = true os números vêm das estatísticas do planner
+-- (pg_class.reltuples e pg_stats.most_common_freqs), sem varrer as tabelas.
+
+CREATE INDEX IF NOT EXISTS devices_status_idx ON devices (status);
+CREATE INDEX IF NOT EXISTS alerts_status_idx ON alerts (status);
+
+CREATE OR REPLACE FUNCTION estimated_status_counts(tbl text)
+RETURNS json
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT json_build_object(
+        'total', (SELECT GREATEST(c.reltuples, 0)::bigint FROM pg_class c WHERE c.oid = ('public.' || tbl)::regclass),
+        'by_status', COALESCE((
+            SELECT json_object_agg(v.val, round(v.freq * c.reltuples)::bigint)
+            FROM pg_class c
+            JOIN pg_stats s ON s.schemaname = 'public' AND s.tablename = tbl AND s.attname = 'status'
+            CROSS JOIN LATERAL unnest(s.most_common_vals::text::text[], s.most_common_freqs) AS v(val, freq)
+            WHERE c.oid = ('public.' || tbl)::regclass
+        ), '{}'::json)
+    );
+$$;
+
+CREATE OR REPLACE FUNCTION dashboard_stats(use_estimate boolean DEFAULT false)
+RETURNS json
+LANGUAGE plpgsql
+STABLE
+AS $$
+BEGIN
+    IF use_estimate THEN
+        RETURN json_build_object(
+            'devices', estimated_status_counts('devices'),
+            'alerts', estimated_status_counts('alerts'),
+            'sites', json_build_object('total', (estimated_status_counts('sites') ->> 'total')::bigint)
+        );
+    END IF;
+
+    RETURN json_build_object(
+        'devices', (
+            SELECT json_build_object(
+                'total', COALESCE(sum(n), 0),
+                'by_status', COALESCE(json_object_agg(status, n), '{}'::json)
+            )
+            FROM (SELECT COALESCE(status, 'unknown') AS status, count(*) AS n FROM devices GROUP BY 1) d
+        ),
+        'alerts', (
+            SELECT json_build_object(
+                'total', COALESCE(sum(n), 0),
+                'by_status', COALESCE(json_object_agg(status, n), '{}'::json)
+            )
+            FROM (SELECT COALESCE(status, 'unknown') AS status, count(*) AS n FROM alerts GROUP BY 1) a
+        ),
+        'sites', json_build_object('total', (SELECT count(*) FROM sites))
+    );
+END;
+$$;
@@ -0,0 +1,9 @@
+-- Paginação por cursor (SupabaseManager.get_devices_page / get_alerts_page)
+-- Os índices seguem exatamente a ordenação usada pelo keyset, para que cada
+-- página seja uma leitura de índice a partir do cursor, sem OFFSET.
+
+CREATE INDEX IF NOT EXISTS devices_hostname_uid_idx
+    ON devices (hostname ASC NULLS LAST, uid ASC);
+
+CREATE INDEX IF NOT EXISTS alerts_created_at_uid_idx
+    ON alerts (created_at DESC NULLS LAST, uid DESC);
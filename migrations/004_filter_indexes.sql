@@ -0,0 +1,31 @@
+-- Índices compostos para os filtros de /devices e /alerts (DEVICE_FILTERS / ALERT_FILTERS)
+-- Filtros de igualdade vêm primeiro e terminam na ordenação do keyset, de modo
+-- que filtro + página seja uma única varredura de índice. A posição dos nulos
+-- acompanha o parâmetro `order` enviado por _order_by (nullslast na ida; a volta
+-- percorre o mesmo índice ao contrário).
+
+-- Dispositivos: site e/ou status, ordenados por hostname
+CREATE INDEX IF NOT EXISTS devices_site_status_hostname_idx
+    ON devices (site_uid, status, hostname ASC NULLS LAST, uid ASC);
+CREATE INDEX IF NOT EXISTS devices_site_hostname_idx
+    ON devices (site_uid, hostname ASC NULLS LAST, uid ASC);
+CREATE INDEX IF NOT EXISTS devices_status_hostname_idx
+    ON devices (status, hostname ASC NULLS LAST, uid ASC);
+
+-- Dispositivos: prefixo de hostname (LIKE 'abc%') e ordenação/intervalo por última atividade
+CREATE INDEX IF NOT EXISTS devices_hostname_pattern_idx
+    ON devices (hostname text_pattern_ops);
+CREATE INDEX IF NOT EXISTS devices_last_seen_uid_idx
+    ON devices (last_seen DESC NULLS LAST, uid DESC);
+CREATE INDEX IF NOT EXISTS devices_status_last_seen_idx
+    ON devices (status, last_seen DESC NULLS LAST, uid DESC);
+
+-- Alertas: status/severidade/dispositivo, ordenados por data de criação
+CREATE INDEX IF NOT EXISTS alerts_status_created_idx
+    ON alerts (status, created_at DESC NULLS LAST, uid DESC);
+CREATE INDEX IF NOT EXISTS alerts_status_severity_created_idx
+    ON alerts (status, severity, created_at DESC NULLS LAST, uid DESC);
+CREATE INDEX IF NOT EXISTS alerts_severity_created_idx
+    ON alerts (severity, created_at DESC NULLS LAST, uid DESC);
+CREATE INDEX IF NOT EXISTS alerts_device_created_idx
+    ON alerts (device_uid, created_at DESC NULLS LAST, uid DESC);
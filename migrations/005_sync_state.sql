@@ -0,0 +1,13 @@
+-- Marcas d'água da sincronização delta (DataCollector._sync_entity)
+-- Uma linha por entidade com o início da última sincronização bem-sucedida,
+-- a última reconciliação completa e quantos registros cada modo transferiu.
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    entity text PRIMARY KEY,
+    last_synced_at timestamptz,
+    last_full_sync_at timestamptz,
+    last_mode text,
+    last_full_records integer,
+    last_delta_records integer,
+    updated_at timestamptz DEFAULT now()
+);
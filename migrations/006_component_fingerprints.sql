@@ -0,0 +1,45 @@
+-- Componentes por impressão digital (DataCollector.collect_all_components)
+-- Cada dispositivo guarda o hash do seu conjunto de componentes: dispositivos
+-- sem alteração não geram gravações, e os alterados têm os componentes
+-- substituídos (DELETE + INSERT) em uma única transação.
+
+CREATE TABLE IF NOT EXISTS device_component_fingerprints (
+    device_uid text PRIMARY KEY,
+    fingerprint text NOT NULL,
+    component_count integer,
+    updated_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS device_components_device_uid_idx ON device_components (device_uid);
+
+-- payload: [{"device_uid": ..., "fingerprint": ..., "components": [{...}, ...]}, ...]
+CREATE OR REPLACE FUNCTION replace_device_components(payload jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM device_components
+    WHERE device_uid::text IN (SELECT d->>'device_uid' FROM jsonb_array_elements(payload) AS d);
+
+    INSERT INTO device_components
+    SELECT r.*
+    FROM jsonb_array_elements(payload) AS d,
+         jsonb_populate_recordset(NULL::device_components, d->'components') AS r;
+
+    INSERT INTO device_component_fingerprints (device_uid, fingerprint, component_count, updated_at)
+    SELECT d->>'device_uid', d->>'fingerprint', jsonb_array_length(d->'components'), now()
+    FROM jsonb_array_elements(payload) AS d
+    ON CONFLICT (device_uid) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint,
+            component_count = EXCLUDED.component_count,
+            updated_at = EXCLUDED.updated_at;
+
+    RETURN jsonb_array_length(payload);
+END;
+$$;
+
+-- Limpeza única das duplicatas acumuladas: as impressões digitais começam
+-- vazias, então a próxima sincronização substitui os componentes de todos os
+-- dispositivos; aqui saem os de dispositivos que já não existem.
+DELETE FROM device_components
+WHERE device_uid::text NOT IN (SELECT uid::text FROM devices);
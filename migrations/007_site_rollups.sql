@@ -0,0 +1,88 @@
+-- Agregados por site calculados na sincronização (SupabaseManager.refresh_site_rollups)
+-- Dispositivos por status, alertas abertos por severidade e a última atividade de
+-- cada site. A página /sites lê sites e site_rollups em uma única consulta (embed
+-- pela chave estrangeira), sem varrer devices e alerts a cada requisição.
+
+CREATE TABLE IF NOT EXISTS site_rollups (
+    site_uid text PRIMARY KEY REFERENCES sites (uid) ON DELETE CASCADE,
+    total_devices integer NOT NULL DEFAULT 0,
+    devices_by_status jsonb NOT NULL DEFAULT '{}'::jsonb,
+    open_alerts integer NOT NULL DEFAULT 0,
+    open_alerts_by_severity jsonb NOT NULL DEFAULT '{}'::jsonb,
+    last_seen_max timestamptz,
+    updated_at timestamptz DEFAULT now()
+);
+
+-- Agrupamento por site dos dispositivos e junção alerta -> dispositivo
+CREATE INDEX IF NOT EXISTS devices_site_status_idx ON devices (site_uid, status);
+CREATE INDEX IF NOT EXISTS alerts_open_device_idx ON alerts (device_uid) WHERE status IS DISTINCT FROM 'resolved';
+
+-- Recalcula os agregados de todos os sites (site_uids = NULL) ou apenas dos informados.
+-- Só regrava as linhas cujos valores mudaram; retorna quantas foram gravadas.
+CREATE OR REPLACE FUNCTION refresh_site_rollups(site_uids text[] DEFAULT NULL)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    changed integer;
+BEGIN
+    WITH device_counts AS (
+        SELECT site_uid, COALESCE(status, 'unknown') AS status, count(*) AS n,
+               max(last_seen::timestamptz) AS last_seen
+        FROM devices
+        WHERE site_uids IS NULL OR site_uid = ANY (site_uids)
+        GROUP BY 1, 2
+    ),
+    devices_by_site AS (
+        SELECT site_uid, sum(n)::integer AS total, jsonb_object_agg(status, n) AS by_status,
+               max(last_seen) AS last_seen_max
+        FROM device_counts
+        GROUP BY site_uid
+    ),
+    alert_counts AS (
+        SELECT d.site_uid, COALESCE(a.severity, 'unknown') AS severity, count(*) AS n
+        FROM alerts a
+        JOIN devices d ON d.uid = a.device_uid
+        WHERE a.status IS DISTINCT FROM 'resolved'
+          AND (site_uids IS NULL OR d.site_uid = ANY (site_uids))
+        GROUP BY 1, 2
+    ),
+    alerts_by_site AS (
+        SELECT site_uid, sum(n)::integer AS total, jsonb_object_agg(severity, n) AS by_severity
+        FROM alert_counts
+        GROUP BY site_uid
+    )
+    INSERT INTO site_rollups AS r (
+        site_uid, total_devices, devices_by_status, open_alerts, open_alerts_by_severity, last_seen_max, updated_at
+    )
+    SELECT s.uid,
+           COALESCE(d.total, 0),
+           COALESCE(d.by_status, '{}'::jsonb),
+           COALESCE(a.total, 0),
+           COALESCE(a.by_severity, '{}'::jsonb),
+           d.last_seen_max,
+           now()
+    FROM sites s
+    LEFT JOIN devices_by_site d ON d.site_uid = s.uid
+    LEFT JOIN alerts_by_site a ON a.site_uid = s.uid
+    WHERE site_uids IS NULL OR s.uid = ANY (site_uids)
+    ON CONFLICT (site_uid) DO UPDATE SET
+        total_devices = excluded.total_devices,
+        devices_by_status = excluded.devices_by_status,
+        open_alerts = excluded.open_alerts,
+        open_alerts_by_severity = excluded.open_alerts_by_severity,
+        last_seen_max = excluded.last_seen_max,
+        updated_at = now()
+    WHERE (r.total_devices, r.devices_by_status, r.open_alerts, r.open_alerts_by_severity, r.last_seen_max)
+          IS DISTINCT FROM
+          (excluded.total_devices, excluded.devices_by_status, excluded.open_alerts,
+           excluded.open_alerts_by_severity, excluded.last_seen_max);
+
+    GET DIAGNOSTICS changed = ROW_COUNT;
+    -- Sites removidos saem pela chave estrangeira (ON DELETE CASCADE)
+    RETURN changed;
+END;
+$$;
+
+-- Agregados iniciais
+SELECT refresh_site_rollups();
@@ -0,0 +1,96 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class RateLimitExceeded(Exception):
+    """A API continuou respondendo 429 depois de todas as tentativas."""
+
+
+class TokenBucket:
+    """Limitador token bucket: `rate` requisições por `period` segundos, com rajadas de até `burst`."""
+    
+    def __init__(self, rate: Optional[int] = None, period: Optional[float] = None, burst: Optional[int] = None):
+        self.rate = rate or int(os.getenv("DATTO_RATE_LIMIT", "600"))
+        self.period = period or float(os.getenv("DATTO_RATE_PERIOD", "60"))
+        self.capacity = max(1, burst or int(os.getenv("DATTO_RATE_BURST", "20")))
+        self.fill_rate = self.rate / self.period
+        
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # Compartilhado entre coletores de loops/threads diferentes no mesmo processo
+        self._lock = threading.Lock()
+        
+        self.stats = {'acquired': 0, 'waited': 0, 'wait_seconds': 0.0, 'pauses': 0}
+    
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+        self._updated = now
+    
+    def _try_acquire(self) -> float:
+        """Retira um token se houver; senão retorna quantos segundos esperar."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.fill_rate
+    
+    async def acquire(self) -> None:
+        """Aguarda até que uma requisição possa ser enviada sem ultrapassar a cota."""
+        waited = 0.0
+        while True:
+            delay = self._try_acquire()
+            if delay <= 0:
+                break
+            waited += delay
+            await asyncio.sleep(delay)
+        
+        self.stats['acquired'] += 1
+        if waited:
+            self.stats['waited'] += 1
+            self.stats['wait_seconds'] += waited
+    
+    def pause(self, seconds: float) -> None:
+        """Suspende todas as requisições (ex.: Retry-After de um 429) e esvazia o balde."""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = self._blocked_until
+            self.stats['pauses'] += 1
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Atraso exponencial com jitter completo para a tentativa `attempt` (a partir de 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+# Cota da conta Datto compartilhada por todos os coletores do processo
+datto_rate_limiter = TokenBucket()
@@ -0,0 +1,74 @@
+import os
+import json
+import gzip
+import uuid
+import hashlib
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+
+class ResponseCache:
+    """Cache em disco das respostas da API Datto (corpo + ETag/Last-Modified) para requisições condicionais."""
+    
+    def __init__(self, directory: Optional[str] = None, enabled: Optional[bool] = None):
+        self.directory = directory or os.getenv("DATTO_RESPONSE_CACHE_DIR", "data/http_cache")
+        if enabled is None:
+            enabled = os.getenv("DATTO_RESPONSE_CACHE", "true").lower() == "true"
+        self.enabled = enabled
+    
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Chave estável para URL + parâmetros (a ordem dos parâmetros não importa)."""
+        payload = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        # Subdiretórios pelo prefixo da chave evitam milhares de arquivos em um único diretório
+        return os.path.join(self.directory, key[:2], key + '.json.gz')
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Retorna {'etag', 'last_modified', 'body', 'stored_at'} ou None."""
+        if not self.enabled:
+            return None
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️  Entrada do cache HTTP ilegível ({key}): {e}")
+            return None
+    
+    def set(self, key: str, body: Any, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Grava a resposta de forma atômica; respostas sem validadores não são guardadas."""
+        if not self.enabled or not (etag or last_modified):
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        entry = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': body,
+            'stored_at': datetime.now(timezone.utc).isoformat()
+        }
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f, default=str)
+        os.replace(tmp_path, path)
+    
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """Cabeçalhos If-None-Match / If-Modified-Since a partir de uma entrada do cache."""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
@@ -33,10 +33,136 @@ function showNotification(message, type = 'info') {
     }
 }
 
-// Função para atualizar dados em tempo real (placeholder)
+// Função para atualizar dados em tempo real (Server-Sent Events no dashboard)
 function startRealTimeUpdates() {
-    // TODO: Implementar atualizações em tempo real via WebSocket ou polling
-    setInterval(updateLastUpdate, 60000); // Atualiza a cada minuto
+    const dashboard = document.getElementById('live-dashboard');
+    if (!dashboard || !window.EventSource) {
+        setInterval(updateLastUpdate, 60000); // Atualiza a cada minuto
+        return;
+    }
+    
+    // O navegador reconecta sozinho e envia o último id recebido (Last-Event-ID)
+    const source = new EventSource(dashboard.dataset.eventsUrl);
+    
+    // Fim de uma sincronização: estatísticas e listas recentes completas
+    source.addEventListener('dashboard', function(event) {
+        const data = JSON.parse(event.data);
+        updateStats(data.stats);
+        if (data.recent_devices) {
+            renderRecentDevices(data.recent_devices);
+        }
+        if (data.recent_alerts) {
+            renderRecentAlerts(data.recent_alerts);
+        }
+        updateLastUpdate();
+    });
+    
+    // Alerta resolvido: apenas a linha do alerta e as estatísticas
+    source.addEventListener('alert', function(event) {
+        const data = JSON.parse(event.data);
+        updateStats(data.stats);
+        patchAlertStatus(data.alert.uid, data.alert.status);
+        updateLastUpdate();
+    });
+    
+    window.addEventListener('beforeunload', function() {
+        source.close();
+    });
+}
+
+// Atualiza os cartões de estatísticas (elementos com data-stat)
+function updateStats(stats) {
+    if (!stats) return;
+    document.querySelectorAll('[data-stat]').forEach(element => {
+        const key = element.dataset.stat;
+        if (key in stats) {
+            element.textContent = stats[key] || 0;
+        }
+    });
+}
+
+// Cria uma célula de tabela com texto ou elemento
+function createCell(content) {
+    const cell = document.createElement('td');
+    if (content instanceof Node) {
+        cell.appendChild(content);
+    } else {
+        cell.textContent = content;
+    }
+    return cell;
+}
+
+// Cria um badge Bootstrap
+function createBadge(text, badgeClass) {
+    const badge = document.createElement('span');
+    badge.className = `badge ${badgeClass}`;
+    badge.textContent = text;
+    return badge;
+}
+
+// Substitui as linhas de uma tabela (ou mostra a mensagem de lista vazia)
+function replaceRows(tbodyId, rows, emptyMessage) {
+    const tbody = document.getElementById(tbodyId);
+    if (!tbody) return;
+    
+    tbody.replaceChildren(...rows);
+    if (!rows.length) {
+        const row = document.createElement('tr');
+        const cell = createCell(emptyMessage);
+        cell.colSpan = 4;
+        cell.className = 'text-center text-muted';
+        row.appendChild(cell);
+        tbody.appendChild(row);
+    }
+}
+
+// Dispositivos recentes (mesmo formato do template dashboard.html)
+function renderRecentDevices(devices) {
+    const rows = devices.map(device => {
+        const row = document.createElement('tr');
+        const link = document.createElement('a');
+        link.href = `/device/${encodeURIComponent(device.uid)}`;
+        link.className = 'text-decoration-none';
+        link.textContent = device.hostname;
+        
+        row.appendChild(createCell(link));
+        row.appendChild(createCell(device.site_uid || ''));
+        row.appendChild(createCell(createBadge(device.status, device.status === 'online' ? 'bg-success' : 'bg-danger')));
+        row.appendChild(createCell(device.last_seen ? device.last_seen.slice(0, 10) : 'N/A'));
+        return row;
+    });
+    replaceRows('recent-devices', rows, 'Nenhum dispositivo recente');
+}
+
+// Alertas recentes (mesmo formato do template dashboard.html)
+function renderRecentAlerts(alerts) {
+    const severityClass = { 'high': 'bg-danger', 'medium': 'bg-warning' };
+    const rows = alerts.map(alert => {
+        const row = document.createElement('tr');
+        row.dataset.alertUid = alert.uid;
+        
+        const status = createCell(createBadge(alert.status, alert.status === 'new' ? 'bg-warning' : 'bg-success'));
+        status.dataset.field = 'status';
+        
+        row.appendChild(createCell(alert.device_uid || ''));
+        row.appendChild(createCell(createBadge(alert.alert_type, severityClass[alert.severity] || 'bg-info')));
+        row.appendChild(status);
+        row.appendChild(createCell(alert.created_at ? alert.created_at.slice(0, 10) : 'N/A'));
+        return row;
+    });
+    replaceRows('recent-alerts', rows, 'Nenhum alerta recente');
+}
+
+// Atualiza o status de um alerta já exibido
+function patchAlertStatus(uid, status) {
+    const tbody = document.getElementById('recent-alerts');
+    if (!tbody) return;
+    
+    const row = Array.from(tbody.querySelectorAll('tr[data-alert-uid]')).find(tr => tr.dataset.alertUid === uid);
+    const cell = row && row.querySelector('[data-field="status"]');
+    if (cell) {
+        cell.replaceChildren(createBadge(status, status === 'new' ? 'bg-warning' : 'bg-success'));
+    }
 }
 
 // Função para formatar datas
@@ -1,11 +1,277 @@
 import os
+import json
+import time
+import base64
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional, Tuple
+from fleet_snapshot import fleet_snapshot
+from metrics import supabase_queries, supabase_query_duration
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
 import asyncio
 
 load_dotenv()
 
+class ReadCache:
+    """Cache TTL + LRU em memória para as leituras do SupabaseManager."""
+    
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[float, Tuple[str, ...], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Gerações por tabela (e global), incrementadas a cada invalidação
+        self._generations: Dict[str, int] = {}
+        self._generation_all = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+    
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[2]
+    
+    def generation(self, tables: Tuple[str, ...]) -> Tuple[int, ...]:
+        """Gerações atuais das tabelas; mudam quando uma delas (ou todo o cache) é invalidada."""
+        with self._lock:
+            return self._generation(tables)
+    
+    def _generation(self, tables: Tuple[str, ...]) -> Tuple[int, ...]:
+        return (self._generation_all,) + tuple(self._generations.get(table, 0) for table in tables)
+    
+    def set(self, key: Tuple, tables: Tuple[str, ...], value: Any, generation: Optional[Tuple[int, ...]] = None) -> None:
+        """Guarda o valor; com `generation`, descarta-o se alguma tabela foi invalidada desde a leitura."""
+        with self._lock:
+            if generation is not None and generation != self._generation(tables):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, tables, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, *tables: str) -> None:
+        """Remove as entradas que dependem das tabelas informadas (todas, se nenhuma for informada)."""
+        with self._lock:
+            if not tables:
+                self._entries.clear()
+                self._generation_all += 1
+            else:
+                for table in tables:
+                    self._generations[table] = self._generations.get(table, 0) + 1
+                stale = [key for key, entry in self._entries.items() if set(entry[1]) & set(tables)]
+                for key in stale:
+                    del self._entries[key]
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'entries': len(self._entries),
+                'invalidations': self.invalidations,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries
+            }
+
+# Compartilhado por todas as instâncias do processo: o DataCollector usa o seu próprio
+# SupabaseManager e precisa invalidar o cache lido pelas rotas do app
+read_cache = ReadCache(
+    ttl=float(os.getenv("SUPABASE_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("SUPABASE_CACHE_MAX_ENTRIES", "256"))
+)
+
+# Pool de threads limitado para as chamadas síncronas do cliente Supabase (PostgREST),
+# compartilhado por todas as instâncias para não multiplicar threads
+query_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SUPABASE_MAX_WORKERS", "8")),
+    thread_name_prefix="supabase"
+)
+
+# Paginação por cursor: tamanho de página e ordenação (a última coluna deve ser única)
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+MAX_PAGE_SIZE = int(os.getenv("PAGE_SIZE_MAX", "200"))
+DEVICES_SORTS = {
+    'hostname': [('hostname', False), ('uid', False)],
+    'last_seen': [('last_seen', True), ('uid', True)],
+}
+ALERTS_SORTS = {
+    'newest': [('created_at', True), ('uid', True)],
+    'oldest': [('created_at', False), ('uid', False)],
+}
+
+# Filtros aceitos por tabela: nome do filtro -> (coluna, operador). Todos são aplicados no
+# banco; valores separados por vírgula em filtros 'eq' viram IN (...)
+DEVICE_FILTERS = {
+    'site_uid': ('site_uid', 'eq'),
+    'status': ('status', 'eq'),
+    'hostname_prefix': ('hostname', 'prefix'),
+    'last_seen_from': ('last_seen', 'gte'),
+    'last_seen_to': ('last_seen', 'lte'),
+}
+ALERT_FILTERS = {
+    'severity': ('severity', 'eq'),
+    'status': ('status', 'eq'),
+    'device_uid': ('device_uid', 'eq'),
+    'created_from': ('created_at', 'gte'),
+    'created_to': ('created_at', 'lte'),
+}
+
+# Exportação completa: ordem por chave única (keyset) e filtros aceitos por tabela
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_ORDER = {
+    'devices': [('uid', False)],
+    'alerts': [('uid', False)],
+    'sites': [('uid', False)],
+    'device_components': [('device_uid', False), ('uid', False)],
+}
+EXPORT_FILTERS = {
+    'devices': DEVICE_FILTERS,
+    'alerts': ALERT_FILTERS,
+    'sites': {},
+    'device_components': {'device_uid': ('device_uid', 'eq')},
+}
+
+def _apply_filters(query, spec: Dict[str, Tuple[str, str]], filters: Optional[Dict[str, Any]]):
+    """Aplica à consulta os filtros conhecidos em `spec`, ignorando vazios e 'all'."""
+    for name, value in (filters or {}).items():
+        if name not in spec or value in (None, '', 'all'):
+            continue
+        column, operator = spec[name]
+        if operator == 'eq':
+            values = value if isinstance(value, (list, tuple)) else str(value).split(',')
+            values = [v.strip() for v in values if v.strip()]
+            if len(values) == 1:
+                query = query.eq(column, values[0])
+            elif values:
+                query = query.in_(column, values)
+        elif operator == 'prefix':
+            # LIKE 'prefixo%' com curingas escapados: usa o índice text_pattern_ops
+            escaped = str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_').replace('*', '')
+            query = query.like(column, f'{escaped}*')
+        else:
+            # Data sem horário como limite superior inclui o dia inteiro
+            if operator == 'lte' and len(str(value)) == 10:
+                value = f'{value}T23:59:59.999999'
+            query = getattr(query, operator)(column, value)
+    return query
+
+def encode_cursor(values: List[Any]) -> str:
+    """Codifica os valores das colunas de ordenação de uma linha em um cursor opaco."""
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> List[Any]:
+    padding = '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    if not isinstance(values, list):
+        raise ValueError("Cursor inválido")
+    return values
+
+def _quote(value: Any) -> str:
+    """Escapa um valor para uso em filtros lógicos do PostgREST (or/and)."""
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+def _apply_keyset(query, sort: List[Tuple[str, bool]], values: List[Any], forward: bool):
+    """Filtra as linhas posteriores (forward) ou anteriores ao cursor na ordem `sort`, com nulos no fim."""
+    # (c1, ..., cn) "depois de" (v1, ..., vn) vira um OR de ramos: c1..ci-1 iguais e ci além de vi
+    branches = []
+    for i, (column, desc) in enumerate(sort):
+        prefix = [
+            f'{c}.is.null' if v is None else f'{c}.eq.{_quote(v)}'
+            for (c, _), v in zip(sort[:i], values[:i])
+        ]
+        value = values[i]
+        if value is None:
+            # Nulos ficam no fim: na ida nada vem depois deles; na volta, todos os não nulos vêm antes
+            if forward:
+                continue
+            condition = f'{column}.not.is.null'
+        else:
+            operator = 'lt' if desc == forward else 'gt'
+            condition = f'{column}.{operator}.{_quote(value)}'
+            if forward:
+                condition = f'or({condition},{column}.is.null)'
+        branches.append(f'and({",".join(prefix + [condition])})' if prefix else condition)
+    
+    query.params = query.params.add('or', f'({",".join(branches)})')
+    return query
+
+def _order_by(query, sort: List[Tuple[str, bool]], nullsfirst: bool = False):
+    """Ordena por (coluna, desc) em um único parâmetro `order`, com a posição dos nulos explícita.
+    
+    O `.order()` do postgrest-py repete o parâmetro a cada coluna (o PostgREST usa só um deles)
+    e nunca emite `nullslast`; em DESC o Postgres colocaria os nulos primeiro.
+    """
+    nulls = 'nullsfirst' if nullsfirst else 'nullslast'
+    value = ','.join(f"{column}.{'desc' if desc else 'asc'}.{nulls}" for column, desc in sort)
+    query.params = query.params.set('order', value)
+    return query
+
+def _freeze(value: Any) -> Any:
+    """Converte argumentos em uma chave de cache hashable."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+# Sinaliza, durante uma leitura em cache, que o resultado veio de um caminho de erro
+_read_failed: contextvars.ContextVar[Optional[List[bool]]] = contextvars.ContextVar('read_failed', default=None)
+
+def uncached(value: Any) -> Any:
+    """Devolve um resultado de contingência (erro, página vazia, dados mock) sem deixá-lo entrar no cache."""
+    failed = _read_failed.get()
+    if failed is not None:
+        failed.append(True)
+    return value
+
+def cached_read(*tables: str):
+    """Armazena em cache o resultado de uma leitura que depende das tabelas informadas."""
+    def decorator(f):
+        @wraps(f)
+        async def wrapper(self, *args, **kwargs):
+            if not read_cache.enabled:
+                return await f(self, *args, **kwargs)
+            key = (f.__name__, _freeze(args), _freeze(kwargs))
+            found, value = read_cache.get(key)
+            if found:
+                return value
+            # Uma invalidação durante a leitura (ex.: gravações da sincronização) torna o resultado antigo
+            generation = read_cache.generation(tables)
+            failed: List[bool] = []
+            token = _read_failed.set(failed)
+            try:
+                value = await f(self, *args, **kwargs)
+            finally:
+                _read_failed.reset(token)
+            if failed:
+                # Uma falha transitória não pode ficar servida até o TTL; repassa à leitura externa, se houver
+                return uncached(value)
+            read_cache.set(key, tables, value, generation)
+            return value
+        return wrapper
+    return decorator
+
 class SupabaseManager:
     def __init__(self):
         # Carrega as variáveis de ambiente do arquivo .env
@@ -59,12 +325,100 @@ class SupabaseManager:
                 print("Criando cliente mock para desenvolvimento...")
             self.client = None
         
-
+        # Contagens do dashboard estimadas pelas estatísticas do Postgres (sem varrer as tabelas)
+        self.estimated_counts = os.getenv("SUPABASE_ESTIMATED_COUNTS", "false").lower() == "true"
+        
+        # Tabela site_rollups (migração 007): após uma falha do embed em /sites, só tenta de novo depois da espera
+        self.site_rollups_retry_seconds = float(os.getenv("SITE_ROLLUPS_RETRY_SECONDS", "300"))
+        self.site_rollups_retry_at = 0.0
     
-
     
-    async def get_devices(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Obtém dispositivos com filtros opcionais."""
+    
+    
+    
+    async def execute(self, query) -> Any:
+        """Executa uma consulta do cliente Supabase no pool de threads, sem bloquear o loop."""
+        loop = asyncio.get_running_loop()
+        # Rótulos das métricas pelo caminho PostgREST da consulta: /devices, /rpc/dashboard_stats...
+        table = getattr(query, 'path', '').strip('/') or 'unknown'
+        method = getattr(query, 'http_method', 'unknown')
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            response = await loop.run_in_executor(query_executor, query.execute)
+            outcome = 'ok'
+            return response
+        except asyncio.CancelledError:
+            outcome = 'cancelled'
+            raise
+        finally:
+            supabase_query_duration.observe(time.perf_counter() - started, table=table, method=method)
+            supabase_queries.inc(table=table, method=method, outcome=outcome)
+    
+    def invalidate_cache(self, *tables: str) -> None:
+        """Invalida o cache de leitura das tabelas alteradas (ou todo o cache)."""
+        read_cache.invalidate(*tables)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Retorna os contadores do cache de leitura."""
+        return read_cache.stats()
+    
+    def _page_size(self, page_size: Optional[int]) -> int:
+        """Limita o tamanho de página pedido ao intervalo permitido."""
+        if not page_size:
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(int(page_size), MAX_PAGE_SIZE))
+    
+    async def _fetch_page(self, query, sort: List[Tuple[str, bool]], page_size: int,
+                          after: Optional[str] = None, before: Optional[str] = None) -> Dict[str, Any]:
+        """Busca uma página por keyset (cursor) em vez de OFFSET.
+        
+        `sort` lista (coluna, desc) e deve terminar em uma coluna única (uid). `after` avança a
+        partir do cursor; `before` volta para a página anterior, consultando na ordem inversa.
+        """
+        cursor = before or after
+        forward = before is None
+        
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(sort):
+                raise ValueError("Cursor inválido")
+            query = _apply_keyset(query, sort, values, forward)
+        
+        # Na volta a ordem é invertida (inclusive a posição dos nulos) e o resultado é revertido
+        order = sort if forward else [(column, not desc) for column, desc in sort]
+        query = _order_by(query, order, nullsfirst=not forward)
+        
+        response = await self.execute(query.limit(page_size + 1))
+        rows = response.data or []
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forward:
+            rows.reverse()
+        
+        first = encode_cursor([rows[0].get(c) for c, _ in sort]) if rows else None
+        last = encode_cursor([rows[-1].get(c) for c, _ in sort]) if rows else None
+        if forward:
+            next_cursor = last if has_more else None
+            prev_cursor = first if after else None
+        else:
+            next_cursor = last
+            prev_cursor = first if has_more else None
+        
+        return {
+            'items': rows,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor,
+            'page_size': page_size
+        }
+    
+    @cached_read('devices')
+    async def get_devices_page(self, filters: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None,
+                               after: Optional[str] = None, before: Optional[str] = None,
+                               sort: str = 'hostname') -> Dict[str, Any]:
+        """Obtém uma página de dispositivos filtrada e ordenada no banco, com cursores anterior/próximo."""
+        page_size = self._page_size(page_size)
+        sort = sort if sort in DEVICES_SORTS else 'hostname'
         try:
             # Se não há cliente, retorna dados mock
             if not self.client:
@@ -73,73 +427,158 @@ class SupabaseManager:
                     {'uid': '2', 'hostname': 'server-02', 'site_uid': 'site-1', 'status': 'offline', 'last_seen': '2024-08-02T09:30:00Z'},
                     {'uid': '3', 'hostname': 'workstation-01', 'site_uid': 'site-2', 'status': 'online', 'last_seen': '2024-08-02T10:15:00Z'},
                 ]
-                return mock_devices
-            
-            query = self.client.table('devices').select('*').limit(limit)
-            
-            if filters:
-                if 'site_uid' in filters:
-                    query = query.eq('site_uid', filters['site_uid'])
-                if 'status' in filters and filters['status'] != 'all':
-                    query = query.eq('status', filters['status'])
+                return {'items': mock_devices, 'next_cursor': None, 'prev_cursor': None, 'page_size': page_size}
             
-            response = query.execute()
-            return response.data if response.data else []
+            query = _apply_filters(self.client.table('devices').select('*'), DEVICE_FILTERS, filters)
+            page = await self._fetch_page(query, DEVICES_SORTS[sort], page_size, after, before)
+            page['sort'] = sort
+            return page
         except Exception as e:
             print(f"Erro ao obter dispositivos: {e}")
-            return []
+            return uncached({'items': [], 'next_cursor': None, 'prev_cursor': None, 'page_size': page_size})
     
+    async def get_devices(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Obtém dispositivos com filtros opcionais."""
+        page = await self.get_devices_page(filters, page_size=limit)
+        return page['items']
+    
+    @cached_read('devices')
     async def get_device_details(self, device_uid: str) -> Optional[Dict[str, Any]]:
         """Obtém detalhes de um dispositivo específico."""
+        # Busca O(1) na frota em memória, quando ela reflete o banco
+        if fleet_snapshot.is_complete('devices'):
+            record = fleet_snapshot.get('devices', device_uid)
+            return record.to_row() if record else None
         try:
-            response = self.client.table('devices').select('*').eq('uid', device_uid).execute()
+            response = await self.execute(self.client.table('devices').select('*').eq('uid', device_uid))
             return response.data[0] if response.data else None
         except Exception as e:
             print(f"Erro ao obter detalhes do dispositivo: {e}")
-            return None
+            return uncached(None)
     
-    async def get_alerts(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Obtém alertas com filtros opcionais."""
+    @cached_read('alerts')
+    async def get_alerts_page(self, filters: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None,
+                              after: Optional[str] = None, before: Optional[str] = None,
+                              sort: str = 'newest') -> Dict[str, Any]:
+        """Obtém uma página de alertas filtrada e ordenada no banco, com cursores anterior/próximo."""
+        page_size = self._page_size(page_size)
+        sort = sort if sort in ALERTS_SORTS else 'newest'
         try:
-            query = self.client.table('alerts').select('*').limit(limit)
-            
-            if filters:
-                if 'status' in filters and filters['status'] != 'all':
-                    query = query.eq('status', filters['status'])
-            
-            response = query.execute()
-            return response.data if response.data else []
+            query = _apply_filters(self.client.table('alerts').select('*'), ALERT_FILTERS, filters)
+            page = await self._fetch_page(query, ALERTS_SORTS[sort], page_size, after, before)
+            page['sort'] = sort
+            return page
         except Exception as e:
             print(f"Erro ao obter alertas: {e}")
-            return []
+            return uncached({'items': [], 'next_cursor': None, 'prev_cursor': None, 'page_size': page_size})
     
+    async def get_alerts(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Obtém alertas com filtros opcionais."""
+        page = await self.get_alerts_page(filters, page_size=limit)
+        return page['items']
+    
+    @cached_read('sites', 'site_rollups')
     async def get_sites(self, limit: int = 100) -> List[Dict[str, Any]]:
-        """Obtém todos os sites."""
+        """Obtém todos os sites, com os agregados de site_rollups em `rollup` (migração 007)."""
         try:
-            response = self.client.table('sites').select('*').limit(limit).execute()
-            return response.data if response.data else []
+            with_rollups = time.monotonic() >= self.site_rollups_retry_at
+            if with_rollups:
+                try:
+                    # Uma única consulta: o embed segue a chave estrangeira site_rollups.site_uid -> sites.uid
+                    response = await self.execute(self.client.table('sites').select('*, rollup:site_rollups(*)').limit(limit))
+                except Exception as e:
+                    # Pode ser falha transitória: os sites saem sem agregados e o embed volta após a espera
+                    print(f"⚠️  Agregados por site indisponíveis ({e}); nova tentativa em {self.site_rollups_retry_seconds:.0f}s. "
+                          f"Verifique migrations/007_site_rollups.sql")
+                    self.site_rollups_retry_at = time.monotonic() + self.site_rollups_retry_seconds
+                    with_rollups = False
+            if not with_rollups:
+                response = await self.execute(self.client.table('sites').select('*').limit(limit))
+            
+            sites = response.data if response.data else []
+            for site in sites:
+                rollup = site.get('rollup')
+                # Relação um-para-um: o PostgREST pode devolver objeto ou lista
+                if isinstance(rollup, list):
+                    site['rollup'] = rollup[0] if rollup else None
+            return sites
         except Exception as e:
             print(f"Erro ao obter sites: {e}")
-            return []
+            return uncached([])
     
+    async def refresh_site_rollups(self, site_uids: Optional[List[str]] = None) -> Optional[int]:
+        """Recalcula os agregados por site (todos ou os informados); retorna quantos mudaram."""
+        try:
+            response = await self.execute(self.client.rpc('refresh_site_rollups', {'site_uids': site_uids}))
+        except Exception as e:
+            print(f"⚠️  Agregados por site não atualizados ({e}); aplique migrations/007_site_rollups.sql")
+            return None
+        self.site_rollups_retry_at = 0.0
+        self.invalidate_cache('site_rollups')
+        return response.data if isinstance(response.data, int) else 0
+    
+    async def iter_table(self, table_name: str, filters: Optional[Dict[str, Any]] = None,
+                         batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Percorre todos os registros de uma tabela em lotes por cursor, sem passar pelo cache."""
+        if not self.client:
+            return
+        
+        batch_size = batch_size or EXPORT_BATCH_SIZE
+        cursor = None
+        while True:
+            query = _apply_filters(self.client.table(table_name).select('*'), EXPORT_FILTERS[table_name], filters)
+            page = await self._fetch_page(query, EXPORT_ORDER[table_name], batch_size, after=cursor)
+            if page['items']:
+                yield page['items']
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+    
+    @cached_read('device_components')
     async def get_device_components(self, device_uid: str) -> List[Dict[str, Any]]:
         """Obtém componentes de um dispositivo."""
+        components = fleet_snapshot.components(device_uid)
+        if components is not None:
+            return [component.to_row() for component in components]
         try:
-            response = self.client.table('device_components').select('*').eq('device_uid', device_uid).execute()
+            response = await self.execute(self.client.table('device_components').select('*').eq('device_uid', device_uid))
             return response.data if response.data else []
         except Exception as e:
             print(f"Erro ao obter componentes: {e}")
-            return []
+            return uncached([])
     
     async def resolve_alert(self, alert_uid: str) -> bool:
         """Marca um alerta como resolvido."""
         try:
-            response = self.client.table('alerts').update({'status': 'resolved'}).eq('uid', alert_uid).execute()
-            return len(response.data) > 0
+            response = await self.execute(self.client.table('alerts').update({'status': 'resolved'}).eq('uid', alert_uid))
+            self.invalidate_cache('alerts')
+            if not response.data:
+                return False
+            fleet_snapshot.patch('alerts', alert_uid, status='resolved')
+            
+            # Alertas abertos do site mudaram: recalcula só o agregado dele
+            site_uid = await self._site_of_device(response.data[0].get('device_uid'))
+            if site_uid:
+                await self.refresh_site_rollups([site_uid])
+            return True
         except Exception as e:
             print(f"Erro ao resolver alerta: {e}")
             return False
     
+    async def _site_of_device(self, device_uid: Optional[str]) -> Optional[str]:
+        """Site de um dispositivo, pela frota em memória ou pelo banco."""
+        if not device_uid:
+            return None
+        record = fleet_snapshot.get('devices', device_uid)
+        if record is not None:
+            return record.site_uid
+        try:
+            response = await self.execute(self.client.table('devices').select('site_uid').eq('uid', device_uid).limit(1))
+            return response.data[0].get('site_uid') if response.data else None
+        except Exception as e:
+            print(f"Erro ao obter o site do dispositivo: {e}")
+            return None
+    
     async def create_audit_log(self, action: str, entity_type: str, entity_id: str, details: Dict[str, Any]) -> bool:
         """Cria um log de auditoria."""
         try:
@@ -149,13 +588,14 @@ class SupabaseManager:
                 'entity_id': entity_id,
                 'details': details
             }
-            response = self.client.table('audit_logs').insert(log_data).execute()
+            response = await self.execute(self.client.table('audit_logs').insert(log_data))
             return len(response.data) > 0
         except Exception as e:
             print(f"Erro ao criar log de auditoria: {e}")
             return False
     
-    async def get_dashboard_stats(self) -> Dict[str, Any]:
+    @cached_read('devices', 'alerts', 'sites')
+    async def get_dashboard_stats(self, estimated: Optional[bool] = None) -> Dict[str, Any]:
         """Obtém estatísticas para o dashboard."""
         try:
             # Se não há cliente, retorna dados mock
@@ -169,68 +609,119 @@ class SupabaseManager:
                     'total_sites': 3
                 }
             
-            # Total de dispositivos
-            devices_response = self.client.table('devices').select('count', count='exact').execute()
-            total_devices = devices_response.count if hasattr(devices_response, 'count') else 0
-            
-            # Dispositivos online
-            online_response = self.client.table('devices').select('count', count='exact').eq('status', 'online').execute()
-            online_devices = online_response.count if hasattr(online_response, 'count') else 0
-            
-            # Dispositivos offline
-            offline_devices = total_devices - online_devices
+            # Contagens exatas pelos índices da frota em memória, sem consultar o banco
+            if all(fleet_snapshot.is_complete(table) for table in ('devices', 'alerts', 'sites')):
+                return self._get_dashboard_stats_from_snapshot()
             
-            # Total de alertas
-            alerts_response = self.client.table('alerts').select('count', count='exact').execute()
-            total_alerts = alerts_response.count if hasattr(alerts_response, 'count') else 0
+            if estimated is None:
+                estimated = self.estimated_counts
             
-            # Alertas novos
-            new_alerts_response = self.client.table('alerts').select('count', count='exact').eq('status', 'new').execute()
-            new_alerts = new_alerts_response.count if hasattr(new_alerts_response, 'count') else 0
+            # Uma única chamada à função dashboard_stats (migrations/002_dashboard_stats.sql)
+            try:
+                response = await self.execute(self.client.rpc('dashboard_stats', {'use_estimate': estimated}))
+                data = response.data or {}
+            except Exception as e:
+                print(f"⚠️  RPC dashboard_stats indisponível, usando contagens individuais: {e}")
+                return await self._get_dashboard_stats_by_count()
             
-            # Total de sites
-            sites_response = self.client.table('sites').select('count', count='exact').execute()
-            total_sites = sites_response.count if hasattr(sites_response, 'count') else 0
+            devices = data.get('devices') or {}
+            alerts = data.get('alerts') or {}
+            devices_by_status = devices.get('by_status') or {}
+            alerts_by_status = alerts.get('by_status') or {}
+            total_devices = int(devices.get('total') or 0)
+            online_devices = int(devices_by_status.get('online', 0))
             
             return {
                 'total_devices': total_devices,
                 'online_devices': online_devices,
-                'offline_devices': offline_devices,
-                'total_alerts': total_alerts,
-                'new_alerts': new_alerts,
-                'total_sites': total_sites
+                'offline_devices': total_devices - online_devices,
+                'total_alerts': int(alerts.get('total') or 0),
+                'new_alerts': int(alerts_by_status.get('new', 0)),
+                'total_sites': int((data.get('sites') or {}).get('total') or 0),
+                'devices_by_status': devices_by_status,
+                'alerts_by_status': alerts_by_status,
+                'estimated': estimated
             }
         except Exception as e:
             print(f"Erro ao obter estatísticas: {e}")
-            return {
+            return uncached({
                 'total_devices': 25,
                 'online_devices': 18,
                 'offline_devices': 7,
                 'total_alerts': 5,
                 'new_alerts': 2,
                 'total_sites': 3
-            }
+            })
+    
+    def _get_dashboard_stats_from_snapshot(self) -> Dict[str, Any]:
+        """Estatísticas do dashboard a partir da frota em memória (mesmo formato da RPC)."""
+        by_status = {}
+        for table in ('devices', 'alerts'):
+            counts: Dict[str, int] = {}
+            for status, count in fleet_snapshot.count_by(table, 'status').items():
+                key = status or 'unknown'
+                counts[key] = counts.get(key, 0) + count
+            by_status[table] = counts
+        
+        total_devices = fleet_snapshot.count('devices')
+        online_devices = by_status['devices'].get('online', 0)
+        return {
+            'total_devices': total_devices,
+            'online_devices': online_devices,
+            'offline_devices': total_devices - online_devices,
+            'total_alerts': fleet_snapshot.count('alerts'),
+            'new_alerts': by_status['alerts'].get('new', 0),
+            'total_sites': fleet_snapshot.count('sites'),
+            'devices_by_status': by_status['devices'],
+            'alerts_by_status': by_status['alerts'],
+            'estimated': False
+        }
+    
+    async def _get_dashboard_stats_by_count(self) -> Dict[str, Any]:
+        """Calcula as estatísticas com uma contagem por consulta (quando a RPC não existe)."""
+        # Dispositivos (total e online), alertas (total e novos) e sites, em paralelo
+        devices_response, online_response, alerts_response, new_alerts_response, sites_response = await asyncio.gather(
+            self.execute(self.client.table('devices').select('count', count='exact')),
+            self.execute(self.client.table('devices').select('count', count='exact').eq('status', 'online')),
+            self.execute(self.client.table('alerts').select('count', count='exact')),
+            self.execute(self.client.table('alerts').select('count', count='exact').eq('status', 'new')),
+            self.execute(self.client.table('sites').select('count', count='exact'))
+        )
+        
+        total_devices = devices_response.count if hasattr(devices_response, 'count') else 0
+        online_devices = online_response.count if hasattr(online_response, 'count') else 0
+        
+        return {
+            'total_devices': total_devices,
+            'online_devices': online_devices,
+            'offline_devices': total_devices - online_devices,
+            'total_alerts': alerts_response.count if hasattr(alerts_response, 'count') else 0,
+            'new_alerts': new_alerts_response.count if hasattr(new_alerts_response, 'count') else 0,
+            'total_sites': sites_response.count if hasattr(sites_response, 'count') else 0
+        }
     
+    @cached_read('devices')
     async def get_recent_devices(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Obtém dispositivos recentes para o dashboard."""
         try:
             if not self.client:
                 return []
             
-            response = self.client.table('devices').select('*').order('last_seen', desc=True).limit(limit).execute()
+            response = await self.execute(_order_by(self.client.table('devices').select('*'), [('last_seen', True)]).limit(limit))
             return response.data if response.data else []
         except Exception as e:
             print(f"Erro ao obter dispositivos recentes: {e}")
-            return []
+            return uncached([])
     
+    @cached_read('alerts')
     async def get_recent_alerts(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Obtém alertas recentes para o dashboard."""
         try:
             if not self.client:
                 return []
             
-            response = self.client.table('alerts').select('*').order('created_at', desc=True).limit(limit).execute()
+            response = await self.execute(_order_by(self.client.table('alerts').select('*'), [('created_at', True)]).limit(limit))
             return response.data if response.data else []
         except Exception as e:
             print(f"Erro ao obter alertas recentes: {e}")
-            return []
+            return uncached([])
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from async_loop import submit
+from metrics import sync_jobs
+
+class SyncScheduler:
+    """Executa a sincronização com o Datto em segundo plano, uma de cada vez (single-flight)."""
+    
+    def __init__(self, interval: Optional[float] = None, history: Optional[int] = None):
+        # Intervalo (s) da sincronização periódica; 0 desativa o agendamento
+        self.interval = interval if interval is not None else float(os.getenv("SYNC_INTERVAL_SECONDS", "0"))
+        self.history = history or int(os.getenv("SYNC_JOB_HISTORY", "20"))
+        
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._current_id: Optional[str] = None
+        self._periodic_started = False
+        self._listeners: List[Callable[[Dict[str, Any]], Awaitable[None]]] = []
+    
+    def start(self) -> None:
+        """Inicia a sincronização periódica no loop compartilhado (se configurada)."""
+        if self.interval > 0 and not self._periodic_started:
+            self._periodic_started = True
+            submit(self._periodic())
+            print(f"⏰ Sincronização periódica a cada {self.interval:.0f}s")
+    
+    async def _periodic(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            job, created = await self.trigger(source='schedule')
+            if not created:
+                print(f"⏭️  Sincronização agendada ignorada: job {job['id']} ainda em andamento")
+    
+    @property
+    def current_job(self) -> Optional[Dict[str, Any]]:
+        if self._task is not None and not self._task.done():
+            return self.jobs.get(self._current_id)
+        return None
+    
+    async def trigger(self, source: str = 'manual', full: bool = False) -> Tuple[Dict[str, Any], bool]:
+        """Inicia um job de sincronização. Se já houver um em andamento, retorna esse job.
+        
+        `full=True` ignora as marcas d'água e força a reconciliação completa.
+        """
+        running = self.current_job
+        if running is not None:
+            return dict(running), False
+        
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'id': job_id,
+            'status': 'running',
+            'source': source,
+            'full': full,
+            'created_at': _now(),
+            'finished_at': None,
+            'phase': 'starting',
+            'progress': {},
+            'stats': {},
+            'error': None
+        }
+        self.jobs[job_id] = job
+        while len(self.jobs) > self.history:
+            self.jobs.popitem(last=False)
+        
+        self._current_id = job_id
+        self._task = asyncio.create_task(self._run(job))
+        return dict(job), True
+    
+    async def cancel(self, job_id: str) -> bool:
+        """Cancela o job em andamento. Retorna False se o job não estiver rodando."""
+        running = self.current_job
+        if running is None or running['id'] != job_id:
+            return False
+        self._task.cancel()
+        return True
+    
+    def add_listener(self, callback: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        """Registra uma corrotina chamada com uma cópia do job ao fim de cada sincronização."""
+        self._listeners.append(callback)
+    
+    def get_job(self, job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Retorna uma cópia do job informado (ou do mais recente)."""
+        if job_id is None:
+            job_id = next(reversed(self.jobs), None)
+        job = self.jobs.get(job_id) if job_id else None
+        return dict(job) if job else None
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return [dict(job) for job in reversed(self.jobs.values())]
+    
+    async def _run(self, job: Dict[str, Any]) -> None:
+        from data_collector import DataCollector
+        
+        def on_progress(phase: str, details: Dict[str, Any]) -> None:
+            job['phase'] = phase
+            job['progress'] = {**job['progress'], **details}
+        
+        print(f"🔄 Job de sincronização {job['id']} iniciado ({job['source']})")
+        try:
+            async with DataCollector() as collector:
+                collector.progress_callback = on_progress
+                collector.force_full = job['full']
+                success = await collector.collect_all_data()
+                job['stats'] = dict(collector.last_sync_stats)
+            job['status'] = 'succeeded' if success else 'failed'
+            if not success:
+                job['error'] = 'Erro ao sincronizar dados'
+        except asyncio.CancelledError:
+            job['status'] = 'cancelled'
+            print(f"🛑 Job de sincronização {job['id']} cancelado")
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            print(f"❌ Erro no job de sincronização {job['id']}: {e}")
+        finally:
+            job['finished_at'] = _now()
+            sync_jobs.inc(status=job['status'])
+            print(f"🏁 Job de sincronização {job['id']} finalizado: {job['status']}")
+        
+        for callback in self._listeners:
+            try:
+                await callback(dict(job))
+            except Exception as e:
+                print(f"⚠️  Erro ao notificar o fim do job {job['id']}: {e}")
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
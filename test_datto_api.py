@@ -109,27 +109,26 @@ class DattoAPITester:
         try:
             from data_collector import DataCollector
             
-            collector = DataCollector()
+            async with DataCollector() as collector:
+                # Testa coleta de sites
+                print("📊 Coletando sites...")
+                sites = await collector.collect_sites()
+                print(f"   Sites encontrados: {len(sites)}")
             
-            # Testa coleta de sites
-            print("📊 Coletando sites...")
-            sites = await collector.collect_sites()
-            print(f"   Sites encontrados: {len(sites)}")
+                # Testa coleta de dispositivos
+                print("💻 Coletando dispositivos...")
+                devices = await collector.collect_devices()
+                print(f"   Dispositivos encontrados: {len(devices)}")
             
-            # Testa coleta de dispositivos
-            print("💻 Coletando dispositivos...")
-            devices = await collector.collect_devices()
-            print(f"   Dispositivos encontrados: {len(devices)}")
+                # Testa coleta de alertas
+                print("🚨 Coletando alertas...")
+                alerts = await collector.collect_alerts()
+                print(f"   Alertas encontrados: {len(alerts)}")
             
-            # Testa coleta de alertas
-            print("🚨 Coletando alertas...")
-            alerts = await collector.collect_alerts()
-            print(f"   Alertas encontrados: {len(alerts)}")
-            
-            # Testa estatísticas
-            print("📈 Calculando estatísticas...")
-            stats = await collector.collect_realtime_data()
-            print(f"   Estatísticas: {stats}")
+                # Testa estatísticas
+                print("📈 Calculando estatísticas...")
+                stats = await collector.collect_realtime_data()
+                print(f"   Estatísticas: {stats}")
             
             print("✅ Teste do coletor concluído!")
             
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Testes da coleta de componentes nas sincronizações delta, com a API Datto e o Supabase fake (sem rede)
+"""
+
+import os
+import asyncio
+import tempfile
+import contextlib
+
+_tmp = tempfile.mkdtemp(prefix="ndatto-test-")
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SECRET_KEY", "fake")
+os.environ.update(
+    DATTO_API_KEY="fake", DATTO_API_SECRET="fake",
+    DATTO_RESPONSE_CACHE_DIR=os.path.join(_tmp, "responses"),
+    DATTO_LAST_GOOD_DIR=os.path.join(_tmp, "last-good"),
+)
+
+from benchmarks.fake_supabase import FakeSupabaseClient, install
+
+def _component(uid: str, status: str) -> dict:
+    return {'uid': uid, 'name': 'Disk C:', 'type': 'storage', 'status': status, 'details': '500GB SSD'}
+
+def _collector(components: dict):
+    """DataCollector cujas páginas e componentes vêm da memória; coletas delta não trazem dispositivos."""
+    from data_collector import DataCollector
+    collector = DataCollector()
+    
+    async def paginate(endpoint, params=None, mock_data=None, prefetch=None):
+        if not params and mock_data:
+            yield [dict(record) for record in mock_data]
+    
+    async def request(endpoint, params=None, use_cache=True):
+        device_uid = endpoint.split('/')[1]
+        return {'data': [dict(c) for c in components.get(device_uid, [])]}, False
+    
+    collector._paginate = paginate
+    collector._make_conditional_request = request
+    return collector
+
+def test_component_change_on_unchanged_device_is_synced():
+    """Em modo delta, um componente que muda sem alterar o dispositivo chega ao banco."""
+    client = FakeSupabaseClient()
+    install(client)
+    from data_collector import MOCK_DEVICES
+    
+    device_uid = MOCK_DEVICES[0]['uid']
+    components = {device['uid']: [_component(f"{device['uid']}-disk", 'healthy')] for device in MOCK_DEVICES}
+    
+    async def sync():
+        collector = _collector(components)
+        async with collector:
+            with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                assert await collector.collect_all_data()
+        return collector
+    
+    async def run():
+        first = await sync()
+        components[device_uid] = [_component(f"{device_uid}-disk", 'warning')]
+        second = await sync()
+        return first, second
+    
+    first, second = asyncio.run(run())
+    assert first.last_sync_stats['devices']['mode'] == 'full'
+    assert second.last_sync_stats['devices']['mode'] == 'delta'
+    assert second.last_sync_stats['devices']['transferred'] == 0
+    
+    stored = [c for c in client.tables['device_components'] if c['device_uid'] == device_uid]
+    assert [c['status'] for c in stored] == ['warning'], f"componente alterado não sincronizado: {stored}"
+
+def main():
+    tests = [test_component_change_on_unchanged_device_is_synced]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    return failed == 0
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Testes do cache de leitura do SupabaseManager, com o cliente Supabase fake (sem rede)
+"""
+
+import os
+import asyncio
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.fake")
+os.environ.setdefault("SUPABASE_SECRET_KEY", "fake")
+
+from benchmarks.fake_supabase import FakeSupabaseClient, install
+
+def _manager(client: FakeSupabaseClient):
+    install(client)
+    import supabase_client
+    supabase_client.read_cache.invalidate()
+    return supabase_client.SupabaseManager()
+
+def test_invalidation_during_read_is_not_cached():
+    """Uma leitura iniciada antes de uma invalidação não pode guardar os dados antigos no cache."""
+    client = FakeSupabaseClient()
+    client.tables['devices'] = [{'uid': 'd1', 'hostname': 'antigo', 'last_seen': '2024-08-02T10:00:00Z'}]
+    manager = _manager(client)
+    
+    execute = client._execute
+    synced = []
+    def execute_and_sync(query):
+        # A consulta já leu os dados; a sincronização grava e invalida antes de a leitura terminar
+        response = execute(query)
+        if not synced:
+            synced.append(True)
+            execute(client.table('devices').update({'hostname': 'novo'}).eq('uid', 'd1'))
+            manager.invalidate_cache('devices')
+        return response
+    client._execute = execute_and_sync
+    
+    async def run():
+        first = await manager.get_recent_devices()
+        second = await manager.get_recent_devices()
+        return first, second
+    
+    first, second = asyncio.run(run())
+    assert first[0]['hostname'] == 'antigo'
+    assert second[0]['hostname'] == 'novo', "resultado anterior à invalidação ficou no cache"
+
+def test_failed_read_is_not_cached():
+    """Uma falha transitória não fica servida até o fim do TTL."""
+    client = FakeSupabaseClient()
+    client.tables['devices'] = [{'uid': 'd1', 'hostname': 'server-01', 'last_seen': '2024-08-02T10:00:00Z'}]
+    manager = _manager(client)
+    
+    execute = client._execute
+    failures = [Exception("timeout")]
+    def flaky(query):
+        if failures:
+            raise failures.pop()
+        return execute(query)
+    client._execute = flaky
+    
+    async def run():
+        return await manager.get_recent_devices(), await manager.get_recent_devices()
+    
+    first, second = asyncio.run(run())
+    assert first == []
+    assert second and second[0]['uid'] == 'd1', "falha transitória ficou no cache"
+
+def main():
+    tests = [test_invalidation_during_read_is_not_cached, test_failed_read_is_not_cached]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+    return failed == 0
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)